@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AssetsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'assets'
+
+    def ready(self):
+        # connects the signals evicting saved or deleted users from the user cache.
+        from . import authentication
+        from .jwt_keys import install_token_backend
+        install_token_backend()
@@ -1,41 +1,112 @@
+from django.utils import timezone
+import re
 import requests
+import pandas as pd
 from bs4 import BeautifulSoup
+from .models import ArnRegistry
 
 url = 'https://www.amfiindia.com/modules/NearestFinancialAdvisorsDetails'
 
-# Function to check ARN number sraping data from AMFI website
-def check_arn(arn_number: int):
+NOT_FOUND = 'ARN number not found in AMFI registry.'
+
+# headers of the columns kept from an AMFI export, matched without case. ARNs may be written like ARN-0069.
+ARN_HEADERS = ('arn', 'arn number', 'arn_number')
+NAME_HEADERS = ("arn holder's name", 'arn holder name', 'name')
+EMAIL_HEADERS = ('email', 'email id', 'e-mail')
+
+
+# Function to check ARN number against the local copy of the AMFI registry, one lookup by primary key.
+def check_arn(arn_number):
+    try:
+        entry = ArnRegistry.objects.filter(arn_number=int(arn_number)).values_list('arn_number', 'email').first()
+    except (TypeError, ValueError):
+        entry = None
+    if entry is None:
+        return NOT_FOUND
+    return {"amfi_arn_number": str(entry[0]).zfill(4), "amfi_email": entry[1]}
+
+
+# Function to check ARN number sraping data from AMFI website, used by `sync_arn_registry --scrape`.
+def scrape_arn(arn_number, details_url=url):
     # minimum length of each ARN_number is 4 eg arn_number = 69 convert it to 0069 to process in scrapper.
-    arn_number = str(arn_number)
-    if len(arn_number) == 0:
-        arn_number = "0000"
-    elif len(arn_number) == 1:
-        arn_number = "000"+arn_number
-    elif len(arn_number) == 2:
-        arn_number = "00"+arn_number
-    elif len(arn_number) == 3:
-        arn_number = "0"+arn_number
-        
-    # required payload for scrapping. 
+    arn_number = str(arn_number).zfill(4)
+
+    # required payload for scrapping.
     payload = {
         "nfaARN": arn_number,
         "nfaType": "All"
     }
-    
-    response = requests.post(url, data=payload)
+
+    response = requests.post(details_url, data=payload, timeout=30)
     if response.status_code == 200:
         soup = BeautifulSoup(response.content, 'html.parser')
-        status_element = soup.find_all('tr')[1]
         try:
-            if status_element:
-                td_details = status_element.find_all('td')
-                amfi_arn_number = td_details[1].text.strip()
-                amfi_email = td_details[5].text.strip()
-                return {"amfi_arn_number": amfi_arn_number, "amfi_email": amfi_email}
-            else:
-                return 'ARN number not found in AMFI website.'
-        except:
+            td_details = soup.find_all('tr')[1].find_all('td')
+            return {"amfi_arn_number": td_details[1].text.strip(), "amfi_email": td_details[5].text.strip(), "amfi_name": td_details[2].text.strip()}
+        except IndexError:
             return 'ARN number not found in AMFI website.'
     else:
         return 'Failed to retrieve data. Status code: ' + str(response.status_code)
 
+
+def parse_arn(value):
+    digits = re.sub(r'\D', '', str(value))
+    return int(digits) if digits else None
+
+
+def find_column(columns, headers):
+    for column in columns:
+        if str(column).strip().lower() in headers:
+            return column
+    return None
+
+
+# (arn_number, name, email) of every row of an export chunk, rows without an ARN are skipped.
+def export_rows(frame):
+    arn_column = find_column(frame.columns, ARN_HEADERS)
+    if arn_column is None:
+        raise ValueError('ARN column missing from the AMFI export')
+    name_column = find_column(frame.columns, NAME_HEADERS)
+    email_column = find_column(frame.columns, EMAIL_HEADERS)
+    frame = frame.fillna('')
+    for index in range(len(frame)):
+        arn_number = parse_arn(frame[arn_column].iat[index])
+        if arn_number is None:
+            continue
+        name = str(frame[name_column].iat[index]).strip() if name_column is not None else ''
+        email = str(frame[email_column].iat[index]).strip() if email_column is not None else ''
+        yield arn_number, name, email
+
+
+# chunks of an AMFI export file, Excel workbooks or CSV.
+def export_chunks(source, chunk_size):
+    name = getattr(source, 'name', str(source)).lower()
+    if name.endswith(('.xlsx', '.xls')):
+        yield pd.read_excel(source, dtype=str)
+        return
+    yield from pd.read_csv(source, dtype=str, chunksize=chunk_size)
+
+
+# writes the rows to the registry in batches, new ARNs are added and known ones updated. returns the count.
+def sync_registry(rows, synced_at=None, batch_size=5000):
+    synced_at = synced_at or timezone.now()
+    count = 0
+    batch = {}
+    for arn_number, name, email in rows:
+        batch[arn_number] = ArnRegistry(arn_number=arn_number, name=name, email=email, synced_at=synced_at)
+        if len(batch) >= batch_size:
+            count += write_batch(batch)
+            batch = {}
+    if batch:
+        count += write_batch(batch)
+    return count
+
+
+def write_batch(batch):
+    ArnRegistry.objects.bulk_create(
+        batch.values(),
+        update_conflicts=True,
+        unique_fields=['arn_number'],
+        update_fields=['name', 'email', 'synced_at'],
+    )
+    return len(batch)
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from collections import OrderedDict
+import threading
+from .models import User
+from .revocation import revoked_tokens
+
+# claims LoginJWTSerializer signs into its tokens, enough to authorize and answer a request without a query.
+USER_CLAIMS = ('arn_number', 'email', 'is_staff')
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+# request.user of tokens carrying USER_CLAIMS, built from the token alone. like on User, `pk` is the ARN number
+# (filter related rows with `user_id=user.pk`) and `id` the uuid. the claims hold until the token expires, views
+# which write rows for the user get the User row with user_row().
+class ClaimsUser(TokenUser):
+    @cached_property
+    def pk(self):
+        return self.token['arn_number']
+
+    @cached_property
+    def arn_number(self):
+        return self.token['arn_number']
+
+    @cached_property
+    def email(self):
+        return self.token['email']
+
+
+# per process LRU cache of User rows by uuid, USER_CACHE_SIZE rows at most, disabled when 0. rows saved or
+# deleted in this process are evicted, changes made by other processes show once the row is evicted by size.
+class UserCache:
+    def __init__(self):
+        self.users = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        size = settings.USER_CACHE_SIZE
+        if size:
+            with self.lock:
+                user = self.users.get(user_id)
+                if user is not None:
+                    self.users.move_to_end(user_id)
+                    return user
+        user = User.objects.get(id=user_id)
+        if size:
+            with self.lock:
+                self.users[user_id] = user
+                while len(self.users) > size:
+                    self.users.popitem(last=False)
+        return user
+
+    def evict(self, user_id):
+        with self.lock:
+            self.users.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+user_cache = UserCache()
+
+
+@receiver([post_save, post_delete], sender=User)
+def evict_user(sender, instance, **kwargs):
+    user_cache.evict(instance.id)
+
+
+# the User row behind request.user.
+def user_row(user):
+    if isinstance(user, User):
+        return user
+    try:
+        user = user_cache.get(user.id)
+    except User.DoesNotExist:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return user
+
+
+# one signature check per request. tokens with the user claims need no query, older ones load the user row.
+# revoked tokens are refused, the revocation filter answers without a query for tokens which are not.
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti and revoked_tokens.is_revoked(jti):
+            raise InvalidToken('Token has been revoked')
+        return token
+
+    def get_user(self, validated_token):
+        if all(claim in validated_token for claim in USER_CLAIMS):
+            return ClaimsUser(validated_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        return user_row(TokenUser(validated_token))
@@ -0,0 +1,29 @@
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+import hashlib
+
+
+# strong ETag of a response, a hash of everything the body depends on.
+def response_etag(*parts):
+    return quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest()[:32])
+
+
+# If-None-Match holds the ETag, compared weakly as RFC 9110 asks for this header.
+def not_modified(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in etags)
+
+
+# clients keep the body but revalidate it on every use, it belongs to one user.
+def set_etag(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified_response(etag):
+    return set_etag(HttpResponseNotModified(), etag)
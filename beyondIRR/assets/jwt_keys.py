@@ -0,0 +1,89 @@
+from django.core.exceptions import ImproperlyConfigured
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+from cryptography.hazmat.primitives.serialization import Encoding, PrivateFormat, PublicFormat, NoEncryption
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework_simplejwt import backends
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt import settings as jwt_settings
+
+# key pair types of the asymmetric algorithms tokens can be signed with. simplejwt 5.3 leaves EdDSA (Ed25519)
+# out of the algorithms it accepts, PyJWT signs and verifies it like the others. it is registered before
+# rest_framework_simplejwt.state is imported, which builds a stock TokenBackend of ALGORITHM on import.
+backends.ALLOWED_ALGORITHMS.add('EdDSA')
+
+KEY_TYPES = {
+    'RS256': (rsa.RSAPrivateKey, rsa.RSAPublicKey),
+    'RS384': (rsa.RSAPrivateKey, rsa.RSAPublicKey),
+    'RS512': (rsa.RSAPrivateKey, rsa.RSAPublicKey),
+    'ES256': (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey),
+    'ES384': (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey),
+    'ES512': (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey),
+    'EdDSA': (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey),
+}
+
+CURVES = {'ES256': ec.SECP256R1, 'ES384': ec.SECP384R1, 'ES512': ec.SECP521R1}
+
+
+# new (private, public) PEM key pair for the algorithm, like the openssl commands of the README make.
+def generate_key_pair(algorithm):
+    if algorithm.startswith('RS'):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm in CURVES:
+        private_key = ec.generate_private_key(CURVES[algorithm]())
+    else:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    private_pem = private_key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()).decode()
+    public_pem = private_key.public_key().public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo).decode()
+    return private_pem, public_pem
+
+
+def load_key(key, load, expected_type, algorithm):
+    if isinstance(key, str):
+        key = key.encode()
+    if isinstance(key, bytes):
+        key = load(key)
+    if not isinstance(key, expected_type):
+        raise ImproperlyConfigured(f'SIMPLE_JWT keys do not match ALGORITHM {algorithm}')
+    return key
+
+
+# TokenBackend holding the PEM keys of SIMPLE_JWT parsed into key objects once, PyJWT would parse them again
+# for every token it signs or verifies.
+class KeyTokenBackend(TokenBackend):
+    def __init__(self, algorithm, signing_key=None, verifying_key='', *args, **kwargs):
+        super().__init__(algorithm, signing_key, verifying_key, *args, **kwargs)
+        if algorithm in KEY_TYPES:
+            private_type, public_type = KEY_TYPES[algorithm]
+            self.signing_key = load_key(signing_key, lambda pem: load_pem_private_key(pem, password=None), private_type, algorithm)
+            self.verifying_key = load_key(verifying_key, load_pem_public_key, public_type, algorithm)
+
+
+def token_backend(algorithm, signing_key, verifying_key):
+    # read through the module, simplejwt replaces its api_settings object when SIMPLE_JWT changes.
+    api_settings = jwt_settings.api_settings
+    return KeyTokenBackend(
+        algorithm,
+        signing_key,
+        verifying_key,
+        api_settings.AUDIENCE,
+        api_settings.ISSUER,
+        api_settings.JWK_URL,
+        api_settings.LEEWAY,
+        api_settings.JSON_ENCODER,
+    )
+
+
+# tokens sign and verify through simplejwt's process wide backend, replaced at startup and when tests override
+# SIMPLE_JWT (simplejwt reloads api_settings first, its receiver is connected earlier).
+def install_token_backend():
+    from rest_framework_simplejwt import state
+    api_settings = jwt_settings.api_settings
+    state.token_backend = token_backend(api_settings.ALGORITHM, api_settings.SIGNING_KEY, api_settings.VERIFYING_KEY)
+
+
+@receiver(setting_changed)
+def reinstall_token_backend(setting, **kwargs):
+    if setting == 'SIMPLE_JWT':
+        install_token_backend()
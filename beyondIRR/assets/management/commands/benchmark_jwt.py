@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from datetime import datetime, timedelta, timezone
+import json
+import time
+import uuid
+from assets.jwt_keys import token_backend, generate_key_pair
+
+
+class Command(BaseCommand):
+    help = ('Compare the cost of signing (login) and verifying (every request) access tokens with the JWT algorithms '
+            'SIMPLE_JWT can be set to, with keys parsed once and with PEM keys parsed for every token.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithms', nargs='+', default=['RS256', 'ES256', 'EdDSA'])
+        parser.add_argument('--tokens', type=int, default=2000, help='tokens signed and verified per measurement')
+
+    def handle(self, *args, **options):
+        results = [self.measure(algorithm, options['tokens']) for algorithm in options['algorithms']]
+        self.stdout.write(json.dumps({"results": results}, indent=2))
+
+    def measure(self, algorithm, tokens):
+        private_pem, public_pem = generate_key_pair(algorithm)
+        cached = token_backend(algorithm, private_pem, public_pem)
+        # PEM strings like SIMPLE_JWT holds them, what PyJWT gets from a plain TokenBackend.
+        pem = token_backend(algorithm, private_pem, public_pem)
+        pem.signing_key, pem.verifying_key = private_pem, public_pem
+
+        now = datetime.now(timezone.utc)
+        payload = {
+            "token_type": "access", "exp": now + timedelta(days=1), "iat": now, "jti": uuid.uuid4().hex,
+            "user_id": str(uuid.uuid4()), "arn_number": 54321, "email": "user@example.com", "is_staff": False,
+        }
+        sign_seconds, token = self.per_token(lambda: cached.encode(payload), tokens)
+        verify_seconds, _ = self.per_token(lambda: cached.decode(token), tokens)
+        pem_sign_seconds, _ = self.per_token(lambda: pem.encode(payload), tokens)
+        pem_verify_seconds, _ = self.per_token(lambda: pem.decode(token), tokens)
+        return {
+            "algorithm": algorithm,
+            "token_bytes": len(token),
+            "sign_us": round(sign_seconds * 1e6, 1),
+            "verify_us": round(verify_seconds * 1e6, 1),
+            "sign_pem_us": round(pem_sign_seconds * 1e6, 1),
+            "verify_pem_us": round(pem_verify_seconds * 1e6, 1),
+        }
+
+    def per_token(self, run, tokens):
+        start = time.perf_counter()
+        for _ in range(tokens):
+            output = run()
+        return (time.perf_counter() - start) / tokens, output
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import io
+import requests
+from assets.arn_verification import url, export_chunks, export_rows, scrape_arn, parse_arn, sync_registry
+from assets.models import ArnRegistry
+
+
+class Command(BaseCommand):
+    help = ('Load the AMFI ARN registry signup checks ARNs against, from an AMFI export (CSV or Excel, a file or a '
+            'URL) or by scraping the AMFI website for the given ARNs. Meant to run periodically, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--file', help='path of an AMFI export, .csv or .xlsx')
+        source.add_argument('--url', help='URL of an AMFI export, downloaded and loaded like --file')
+        source.add_argument('--scrape', nargs='+', help='ARN numbers looked up one by one on the AMFI website')
+        parser.add_argument('--scrape-url', default=url, help='AMFI details page --scrape posts to')
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows written per query')
+        parser.add_argument('--prune', action='store_true', help='delete ARNs missing from this export')
+
+    def handle(self, *args, **options):
+        synced_at = timezone.now()
+        if options['scrape']:
+            if options['prune']:
+                raise CommandError('--prune needs a full export, not --scrape')
+            rows = self.scraped_rows(options['scrape'], options['scrape_url'])
+        else:
+            rows = self.export_rows(options['file'] or self.download(options['url']), options['batch_size'])
+        try:
+            count = sync_registry(rows, synced_at, options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        pruned = 0
+        if options['prune']:
+            pruned, _ = ArnRegistry.objects.filter(synced_at__lt=synced_at).delete()
+        self.stdout.write(self.style.SUCCESS(f'Synced {count} ARNs, pruned {pruned}.'))
+
+    def export_rows(self, source, chunk_size):
+        for chunk in export_chunks(source, chunk_size):
+            yield from export_rows(chunk)
+
+    def download(self, export_url):
+        try:
+            response = requests.get(export_url, timeout=60)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise CommandError(f'Failed to download the AMFI export: {e}')
+        source = io.BytesIO(response.content)
+        source.name = export_url.split('?')[0]
+        return source
+
+    def scraped_rows(self, arn_numbers, scrape_url):
+        for arn_number in arn_numbers:
+            try:
+                result = scrape_arn(arn_number, scrape_url)
+            except requests.RequestException as e:
+                raise CommandError(f'Failed to scrape ARN {arn_number}: {e}')
+            if isinstance(result, str):
+                self.stderr.write(f'ARN {arn_number}: {result}')
+                continue
+            yield parse_arn(result['amfi_arn_number']), result['amfi_name'], result['amfi_email']
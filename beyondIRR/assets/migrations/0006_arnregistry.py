@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0005_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArnRegistry',
+            fields=[
+                ('arn_number', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('email', models.CharField(blank=True, default='', max_length=254)),
+                ('synced_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
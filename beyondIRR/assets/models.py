@@ -48,4 +48,25 @@ class LogRequests(models.Model):
     success = models.BooleanField(editable=False, null=True)
 
     def __str__(self):
-        return f"{self.timestamp} - {self.status_code}"
\ No newline at end of file
+        return f"{self.timestamp} - {self.status_code}"
+
+# jti of every token revoked before it expires, the authoritative list behind the in-process revocation filter.
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, primary_key=True)
+    user = models.ForeignKey(to=User, on_delete=models.SET_NULL, null=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+# AMFI registered distributors, filled by `python manage.py sync_arn_registry`. signup checks ARN and email here.
+class ArnRegistry(models.Model):
+    arn_number = models.IntegerField(primary_key=True)
+    name = models.CharField(max_length=255, default='', blank=True)
+    email = models.CharField(max_length=254, default='', blank=True)
+    synced_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"ARN-{self.arn_number}"
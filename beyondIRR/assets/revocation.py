@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from datetime import datetime, timedelta, timezone as dt_timezone
+import hashlib
+import math
+import threading
+import time
+from .models import RevokedToken
+
+
+# set of strings in a fixed bit array. never misses an item added, answers yes for an item never added at about
+# `error_rate` while it holds at most `capacity` items. a check hashes the item once and reads `hashes` bits.
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    # bit positions of the item, derived from the two halves of one digest (double hashing).
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        if item in self:
+            return
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+# revoked token ids of RevokedToken held in a Bloom filter, per process. checks read the filter and only query
+# the table when it answers yes (revoked, or a false positive). the filter loads rows revoked since its last
+# sync at most every TOKEN_REVOCATION_SYNC_SECONDS, revocations of other processes apply within that time, and
+# is rebuilt from the unexpired rows every TOKEN_REVOCATION_REBUILD_SECONDS so expired ids leave it.
+class RevocationList:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.synced_at = None
+        self.next_sync = 0
+        self.next_rebuild = 0
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and now < self.next_sync:
+            return
+        with self.lock:
+            if not force and now < self.next_sync:
+                return
+            started = timezone.now()
+            if self.filter is None or now >= self.next_rebuild or self.filter.count > self.filter.capacity:
+                rows = list(RevokedToken.objects.filter(expires_at__gt=started).values_list('jti', flat=True))
+                self.filter = BloomFilter(max(settings.TOKEN_REVOCATION_CAPACITY, 2 * len(rows)))
+                self.next_rebuild = now + settings.TOKEN_REVOCATION_REBUILD_SECONDS
+            else:
+                # rows are read again for a while, ones committed late by slow transactions are not missed.
+                since = self.synced_at - timedelta(seconds=settings.TOKEN_REVOCATION_SYNC_SECONDS)
+                rows = RevokedToken.objects.filter(revoked_at__gte=since).values_list('jti', flat=True)
+            for jti in rows:
+                self.filter.add(jti)
+            self.synced_at = started
+            self.next_sync = now + settings.TOKEN_REVOCATION_SYNC_SECONDS
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    # records the token as revoked until it expires, this process stops accepting it right away.
+    def revoke(self, token, user_id=None):
+        jti = token[api_settings.JTI_CLAIM]
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        RevokedToken.objects.get_or_create(
+            jti=jti,
+            defaults={"user_id": user_id, "expires_at": datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)},
+        )
+        self.sync()
+        with self.lock:
+            self.filter.add(jti)
+
+
+revoked_tokens = RevocationList()
@@ -3,10 +3,21 @@ from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.validators import UniqueValidator
 from django.contrib.auth import authenticate
+from .authentication import add_user_claims
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-class UserSerializer(serializers.ModelSerializer):
+# takes the `fields` to keep, like `?fields=` of the list endpoints asks for. all fields when None.
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field in set(self.fields) - set(fields):
+                self.fields.pop(field)
+
+
+class UserSerializer(DynamicFieldsModelSerializer):
     password = serializers.CharField(write_only=True)
     email = serializers.EmailField(
         validators=[UniqueValidator(queryset=User.objects.all())]
@@ -41,15 +52,15 @@ class LoginJWTSerializer(serializers.Serializer):
         if user is None:
             raise serializers.ValidationError('Invalid email or password.')
 
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        # Generate JWT tokens, the access token copies the user claims of the refresh token.
+        refresh = add_user_claims(RefreshToken.for_user(user), user)
 
         return {
             'refresh': str(refresh),
             'access': str(refresh.access_token),
         }
     
-class LogRequestsSerializer(serializers.ModelSerializer):
+class LogRequestsSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = LogRequests
         fields = ['id', 'url', 'method', 'request_payload', 'response_payload', 'status_code', 'timestamp', 'success']
@@ -0,0 +1,51 @@
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class InvalidFieldsError(Exception):
+    pass
+
+
+# names asked for with `?fields=a,b`, in the serializer's order. None when every field is wanted.
+def requested_fields(params, available):
+    value = params.get('fields')
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields.difference(available)
+    if unknown:
+        raise InvalidFieldsError(f"Unknown fields {', '.join(sorted(unknown))}. Available fields are {', '.join(available)}")
+    return [field for field in available if field in fields]
+
+
+# fields a client can read from the serializer, write only ones (e.g. password) are never returned.
+def readable_fields(serializer_class):
+    return [name for name, field in serializer_class().fields.items() if not field.write_only]
+
+
+# `?fields=` for list views, only the asked columns are selected and only the asked fields serialized.
+# the serializer must take a `fields` argument (see DynamicFieldsModelSerializer).
+class SparseFieldsMixin:
+    def selected_fields(self):
+        if not hasattr(self, '_selected_fields'):
+            self._selected_fields = requested_fields(self.request.query_params, readable_fields(self.get_serializer_class()))
+        return self._selected_fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.selected_fields()
+        if fields:
+            declared = self.get_serializer_class()().fields
+            queryset = queryset.only(*(declared[field].source for field in fields))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.selected_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.selected_fields()
+        except InvalidFieldsError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
@@ -1,12 +1,43 @@
-from .models import User
+from .models import User, LogRequests, RevokedToken, ArnRegistry
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from .arn_verification import check_arn
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
+from django.test import override_settings
+from .authentication import add_user_claims, user_cache
+from .jwt_keys import token_backend, generate_key_pair
+from .revocation import BloomFilter, revoked_tokens
+import uuid
+from django.utils import timezone
+from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework_simplejwt import state
+from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
+from django.conf import settings
+import jwt
+from .serializers import LoginJWTSerializer
+from django.core.management import call_command, CommandError
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+import tempfile
+import threading
+import os
+
+
+# registry rows of the ARNs the signup tests use, in place of a sync from AMFI.
+def seed_arn_registry():
+    now = timezone.now()
+    ArnRegistry.objects.bulk_create([
+        ArnRegistry(arn_number=87216, name='Nagesh Gupta', email='tnageshgupta@yahoo.com', synced_at=now),
+        ArnRegistry(arn_number=69, name='ARN 69', email='', synced_at=now),
+    ])
 
 class UserTestCase(APITestCase):
     def setUp(self):
+        seed_arn_registry()
         self.url = reverse('signup')
         self.user1 = {
             "email": "user1@example.com",
@@ -63,6 +94,7 @@ class UserTestCase(APITestCase):
 
 class LoginTests(APITestCase):
     def setUp(self):
+        seed_arn_registry()
         self.login = reverse('login')
         self.signup = reverse('signup')
         
@@ -117,6 +149,20 @@ class AllUsersTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(type(response.json()), list)
 
+    def test_sparse_fields(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_token)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + '?fields=email,arn_number')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({tuple(user) for user in response.json()}, {('email', 'arn_number')})
+        select = [query['sql'] for query in queries.captured_queries if 'FROM "assets_user"' in query['sql']][-1]
+        self.assertNotIn('"first_name"', select.split('FROM')[0])
+
+        # password is write only and unknown fields are refused.
+        for fields in ('password', 'email,salary'):
+            response = self.client.get(self.url + '?fields=' + fields)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_unauthorized_access(self):
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
         response = self.client.get(self.url)
@@ -127,6 +173,8 @@ class CurrentUserTests(APITestCase):
         self.url = reverse('curr-list')
         self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
         self.user_token = self.get_jwt_token(self.user) 
+        # query counts leave out the periodic sync of the revocation filter.
+        revoked_tokens.sync(force=True)
           
     def get_jwt_token(self, user):
         refresh = RefreshToken.for_user(user)
@@ -138,6 +186,31 @@ class CurrentUserTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('user_email', response.json())
 
+    def test_one_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['user_arn_number'], 54321)
+
+    def test_deleted_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        self.user.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_not_modified(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        self.user.email = "changed@example.com"
+        self.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['user_email'], "changed@example.com")
+
     def test_unauthorized_access(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -164,7 +237,254 @@ class LogViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(type(response.json()), list)
 
+    def test_sparse_fields(self):
+        LogRequests.objects.create(url='http://testserver/signup/', method='POST', request_payload={}, response_payload='ok', status_code=201)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_token)
+        response = self.client.get(self.url + '?fields=status_code,url')
+        self.assertEqual(response.json(), [{'url': 'http://testserver/signup/', 'status_code': 201}])
+
     def test_unauthorized_access(self):
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
         response = self.client.get(self.url)
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        revoked_tokens.sync(force=True)
+        self.user = User.objects.create_user(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.admin = User.objects.create_user(email="admin@example.com", password="Test@123", arn_number=12345, first_name="Test", is_superuser=True, is_staff=True)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def claims_token(self, user):
+        return str(add_user_claims(RefreshToken.for_user(user), user).access_token)
+
+    def test_login_tokens_carry_claims(self):
+        serializer = LoginJWTSerializer(data={"email": "admin@example.com", "password": "Test@123"})
+        self.assertTrue(serializer.is_valid())
+        for token in (AccessToken(serializer.validated_data['access']), RefreshToken(serializer.validated_data['refresh'])):
+            self.assertEqual((token['arn_number'], token['email'], token['is_staff']), (12345, "admin@example.com", True))
+
+    def test_no_query_with_claims(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.claims_token(self.user))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('curr-list'))
+        self.assertEqual(response.json()['user_email'], "user@example.com")
+        self.assertEqual(response.json()['user_arn_number'], 54321)
+
+    def test_admin_claim(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.claims_token(self.admin))
+        self.assertEqual(self.client.get(reverse('users')).status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.claims_token(self.user))
+        self.assertEqual(self.client.get(reverse('users')).status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(USER_CACHE_SIZE=1)
+    def test_user_cache(self):
+        user_token, admin_token = self.get_jwt_token(self.user), self.get_jwt_token(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + user_token)
+        self.client.get(reverse('curr-list'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('curr-list'))
+
+        # saved rows are evicted.
+        self.user.email = "changed@example.com"
+        self.user.save()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('curr-list'))
+        self.assertEqual(response.json()['user_email'], "changed@example.com")
+
+        # the least recently used row goes when the cache is full.
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + admin_token)
+        self.client.get(reverse('curr-list'))
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + user_token)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('curr-list'))
+
+        self.user.delete()
+        self.assertEqual(self.client.get(reverse('curr-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenBackendTests(APITestCase):
+    def test_algorithms(self):
+        payload = {"user_id": "d4c9f1de-0000-4000-8000-000000000000", "arn_number": 54321}
+        for algorithm in ('RS256', 'ES256', 'EdDSA'):
+            backend = token_backend(algorithm, *generate_key_pair(algorithm))
+            token = backend.encode(payload)
+            self.assertEqual(backend.decode(token), payload)
+            # another key pair of the same type does not verify it.
+            other = token_backend(algorithm, *generate_key_pair(algorithm))
+            with self.assertRaises(Exception):
+                other.decode(token)
+
+    def test_keys_must_match_algorithm(self):
+        with self.assertRaises(ImproperlyConfigured):
+            token_backend('ES256', *generate_key_pair('EdDSA'))
+
+    def test_eddsa_login(self):
+        User.objects.create_user(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        private_key, public_key = generate_key_pair('EdDSA')
+        jwt_settings = {**settings.SIMPLE_JWT, "ALGORITHM": 'EdDSA', "SIGNING_KEY": private_key, "VERIFYING_KEY": public_key}
+        with override_settings(SIMPLE_JWT=jwt_settings):
+            self.assertIsInstance(state.token_backend.signing_key, ed25519.Ed25519PrivateKey)
+            response = self.client.post(reverse('login'), {"email": "user@example.com", "password": "Test@123"}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            access = response.json()['access']
+            self.assertEqual(jwt.get_unverified_header(access)['alg'], 'EdDSA')
+            self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+            self.assertEqual(self.client.get(reverse('curr-list')).status_code, status.HTTP_200_OK)
+        # the startup backend is back, EdDSA tokens no longer verify.
+        self.assertIsInstance(state.token_backend.signing_key, rsa.RSAPrivateKey)
+        self.assertEqual(self.client.get(reverse('curr-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_keys_parsed_once(self):
+        # tokens of the app are signed with the key objects parsed at startup.
+        self.assertIsInstance(state.token_backend.signing_key, rsa.RSAPrivateKey)
+        self.assertIsInstance(state.token_backend.verifying_key, rsa.RSAPublicKey)
+        user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+        self.assertEqual(self.client.get(reverse('curr-list')).status_code, status.HTTP_200_OK)
+
+
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.refresh = add_user_claims(RefreshToken.for_user(self.user), self.user)
+        self.access = str(self.refresh.access_token)
+        revoked_tokens.sync(force=True)
+
+    def test_logout(self):
+        other = str(add_user_claims(RefreshToken.for_user(self.user), self.user).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+        response = self.client.post(reverse('logout'), {"refresh": str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+        response = self.client.get(reverse('curr-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        # other sessions of the user go on.
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + other)
+        self.assertEqual(self.client.get(reverse('curr-list')).status_code, status.HTTP_200_OK)
+
+    def test_refresh_of_another_user(self):
+        other = User.objects.create(email="other@example.com", password="Test@123", arn_number=12345, first_name="Other")
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+        response = self.client.post(reverse('logout'), {"refresh": str(RefreshToken.for_user(other))}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('logout'), {"refresh": "not a token"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_check_needs_no_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('curr-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_revoked_by_another_process(self):
+        # a row written elsewhere is picked up by the next sync.
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+        RevokedToken.objects.create(jti=AccessToken(self.access)['jti'], expires_at=timezone.now() + timedelta(days=1))
+        revoked_tokens.sync(force=True)
+        self.assertEqual(self.client.get(reverse('curr-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(10000, error_rate=0.01)
+        added = [uuid.uuid4().hex for _ in range(10000)]
+        for jti in added:
+            bloom.add(jti)
+        self.assertTrue(all(jti in bloom for jti in added))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+# serves an AMFI export at GET and a details page like AMFI's at POST, for the sync command.
+class AmfiHandler(BaseHTTPRequestHandler):
+    export = b''
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.end_headers()
+        self.wfile.write(self.export)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        rows = '<tr><th>#</th><th>ARN</th><th>Name</th><th>Address</th><th>Pin</th><th>Email</th></tr>'
+        if 'nfaARN=0042' in body:
+            rows += '<tr><td>1</td><td>ARN-0042</td><td>Scraped Holder</td><td>-</td><td>-</td><td>scraped@example.com</td></tr>'
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(f'<table>{rows}</table>'.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class ArnRegistryTests(APITestCase):
+    export = "ARN,ARN Holder's Name,Email\nARN-0069,Holder 69,\nARN-87216,Nagesh Gupta,tnageshgupta@yahoo.com\n,,\n"
+
+    def setUp(self):
+        self.url = reverse('signup')
+        file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        file.write(self.export)
+        file.close()
+        self.path = file.name
+        self.addCleanup(os.remove, self.path)
+
+    def serve(self):
+        AmfiHandler.export = self.export.encode()
+        server = HTTPServer(('127.0.0.1', 0), AmfiHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f'http://127.0.0.1:{server.server_port}/arn_export.csv'
+
+    def sync(self, *args):
+        out = StringIO()
+        call_command('sync_arn_registry', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_sync_from_file(self):
+        output = self.sync('--file', self.path)
+        self.assertIn('Synced 2 ARNs', output)
+        self.assertEqual(check_arn(69), {"amfi_arn_number": "0069", "amfi_email": ""})
+        self.assertEqual(check_arn('87216')['amfi_email'], 'tnageshgupta@yahoo.com')
+        self.assertEqual(ArnRegistry.objects.get(arn_number=87216).name, 'Nagesh Gupta')
+        self.assertEqual(type(check_arn(54321)), str)
+        self.assertEqual(type(check_arn('not a number')), str)
+
+    def test_sync_updates_and_prunes(self):
+        ArnRegistry.objects.create(arn_number=87216, email='old@example.com', synced_at=timezone.now() - timedelta(days=1))
+        ArnRegistry.objects.create(arn_number=11111, email='gone@example.com', synced_at=timezone.now() - timedelta(days=1))
+        output = self.sync('--file', self.path, '--prune', '--batch-size', '1')
+        self.assertIn('pruned 1', output)
+        self.assertEqual(check_arn(87216)['amfi_email'], 'tnageshgupta@yahoo.com')
+        self.assertFalse(ArnRegistry.objects.filter(arn_number=11111).exists())
+
+    def test_sync_from_url(self):
+        self.sync('--url', self.serve())
+        self.assertEqual(ArnRegistry.objects.count(), 2)
+
+    def test_sync_from_scrape(self):
+        url = self.serve()
+        self.sync('--scrape', '42', '54321', '--scrape-url', url)
+        entry = ArnRegistry.objects.get()
+        self.assertEqual((entry.arn_number, entry.name, entry.email), (42, 'Scraped Holder', 'scraped@example.com'))
+
+    def test_export_without_arn_column(self):
+        with open(self.path, 'w') as file:
+            file.write('Name,Email\nHolder,holder@example.com\n')
+        with self.assertRaises(CommandError):
+            self.sync('--file', self.path)
+
+    def test_signup_checks_registry_with_one_query(self):
+        seed_arn_registry()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {"email": "other@example.com", "password": "testpassword123", "arn_number": 87216, "first_name": "Test"}, format='json')
+        self.assertEqual(response.json()['status'], status.HTTP_404_NOT_FOUND)
+        registry = [query['sql'] for query in queries.captured_queries if 'assets_arnregistry' in query['sql']]
+        self.assertEqual(len(registry), 1)
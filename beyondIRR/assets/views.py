@@ -6,9 +6,14 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from .serializers import UserSerializer, LoginJWTSerializer, LogRequestsSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from django.core.exceptions import ValidationError
 from .decorator import log_request
-from .decode_jwt import decode_jwt
+from .sparse_fields import SparseFieldsMixin
+from .conditional import response_etag, not_modified, not_modified_response, set_etag
+from .revocation import revoked_tokens
 from .arn_verification import check_arn
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -38,6 +43,9 @@ class SignUp(APIView):
         - **400 Bad Request**: Validation error. Returns the error message and data.
         - **404 Not Found**: If the ARN number or email does not match the AMFI database.
 
+        ARN numbers and emails are checked against the local copy of the AMFI registry, loaded with
+        `python manage.py sync_arn_registry`.
+
         **Example Request:**
         ```json
         {
@@ -144,7 +152,59 @@ class Login(TokenObtainPairView):
         """
         return super().post(request, *args, **kwargs)
 
-class AllUsers(generics.ListAPIView):
+class Logout(APIView):
+    permission_classes = [IsAuthenticated]
+    @swagger_auto_schema(
+        operation_summary="Log Out",
+        operation_description="""
+        This endpoint revokes the access token it is called with, and the refresh token sent along, before they expire.
+
+        **Authentication:**
+        This endpoint requires JWT authentication. Include your token in the `Authorization` header as follows:
+
+        ```
+        Authorization: Bearer <your_token_here>
+        ```
+
+        **Request Body:**
+        - `refresh`: The refresh token issued with the access token (Optional) (string)
+
+        Revoked tokens are refused at once by the server process which revoked them, and within a few seconds by
+        the others.
+
+        **Response:**
+        - **200 OK**: The tokens are revoked.
+        - **400 Bad Request**: The refresh token is invalid or belongs to another user.
+        - **401 Unauthorized**: Invalid, revoked or missing JWT token.
+
+        **Example Request:**
+        ```json
+        {
+            "refresh": "<your_refresh_token_here>"
+        }
+        ```
+        """,
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={'refresh': openapi.Schema(type=openapi.TYPE_STRING)},
+        ),
+    )
+    def post(self, request, *args, **kwargs):
+        tokens = [request.auth]
+        if request.data.get('refresh'):
+            try:
+                refresh = RefreshToken(request.data['refresh'])
+            except TokenError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if refresh.get(api_settings.USER_ID_CLAIM) != request.auth.get(api_settings.USER_ID_CLAIM):
+                return Response({"error": "Refresh token belongs to another user"}, status=status.HTTP_400_BAD_REQUEST)
+            tokens.append(refresh)
+
+        for token in tokens:
+            revoked_tokens.revoke(token, request.user.pk)
+        return Response({"message": "Logged out"}, status=status.HTTP_200_OK)
+
+class AllUsers(SparseFieldsMixin, generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]  
@@ -161,8 +221,12 @@ class AllUsers(generics.ListAPIView):
         Authorization: Bearer <your_token_here>
         ```
 
+        **Query Parameters:**
+        - **fields**: Comma separated fields to return, e.g. `fields=email,arn_number`. Only those columns are read.
+
         **Response:**
         - **200 OK**: Returns a list of users.
+        - **400 Bad Request**: Unknown field asked for in `fields`.
         
         **Example Response:**
         ```json
@@ -208,8 +272,12 @@ class CurrentUser(APIView):
         Authorization: Bearer <your_token_here>
         ```
 
+        **Conditional Requests:**
+        Responses carry an `ETag`, send it back in `If-None-Match` to get `304 Not Modified` while the details did not change.
+
         **Response:**
         - **200 OK**: Returns the user details.
+        - **304 Not Modified**: `If-None-Match` holds the current `ETag`.
         - **401 Unauthorized**: Invalid or missing JWT token.
 
         **Example Response:**
@@ -223,22 +291,16 @@ class CurrentUser(APIView):
         """,
     )
     def get(self, request, *args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({"error": "Authorization header missing or invalid"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        try:
-            decoded_token = decode_jwt(auth_header)
-            user_id = decoded_token.get('user_id')
-            
-            user = User.objects.get(id=user_id)
-            
-            return Response({"message": "Success", "user_email": user.email, "user_arn_number": user.arn_number}, status=status.HTTP_200_OK)
+        user = request.user
 
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        # the details come with request.user, from the token claims or the user row read to authenticate.
+        etag = response_etag(str(user.id), 'current-user', user.email, user.arn_number)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        response = Response({"message": "Success", "user_email": user.email, "user_arn_number": user.arn_number}, status=status.HTTP_200_OK)
+        return set_etag(response, etag)
 
-class LogView(generics.ListAPIView):
+class LogView(SparseFieldsMixin, generics.ListAPIView):
     queryset = LogRequests.objects.all()
     serializer_class = LogRequestsSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]  
@@ -255,8 +317,12 @@ class LogView(generics.ListAPIView):
         Authorization: Bearer <your_token_here>
         ```
 
+        **Query Parameters:**
+        - **fields**: Comma separated fields to return, e.g. `fields=url,status_code,timestamp`. Only those columns are read.
+
         **Response:**
         - **200 OK**: Returns a list of log requests.
+        - **400 Bad Request**: Unknown field asked for in `fields`.
 
         """,
     )
@@ -37,13 +37,24 @@ AUTH_USER_MODEL = 'assets.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'assets.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
 }
 
+# User rows kept per process for views which need the whole row, tokens issued by `/login/` carry the claims
+# most requests need. rows changed by another process are seen once evicted, 0 turns the cache off.
+USER_CACHE_SIZE = 0
+
+# logged out tokens are refused until they expire. every process keeps the revoked ids in a Bloom filter sized
+# for this many tokens, loads newly revoked ones at most every TOKEN_REVOCATION_SYNC_SECONDS (revocations made by
+# other processes apply within that time) and rebuilds it to forget expired ones.
+TOKEN_REVOCATION_CAPACITY = 100000
+TOKEN_REVOCATION_SYNC_SECONDS = 5
+TOKEN_REVOCATION_REBUILD_SECONDS = 60 * 60
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -51,9 +62,11 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": False,
     "UPDATE_LAST_LOGIN": False,
 
-    "ALGORITHM": "RS256",
-    "SIGNING_KEY": open(BASE_DIR / 'private_key.pem').read(),
-    "VERIFYING_KEY": open(BASE_DIR / 'public_key.pem').read(),
+    # RS256 (default), ES256 or EdDSA, private_key.pem and public_key.pem must be a pair of that type. keys are
+    # parsed once at startup (assets/jwt_keys.py), `python manage.py benchmark_jwt` compares the algorithms.
+    "ALGORITHM": os.environ.get('JWT_ALGORITHM', 'RS256'),
+    "SIGNING_KEY": (BASE_DIR / 'private_key.pem').read_text(),
+    "VERIFYING_KEY": (BASE_DIR / 'public_key.pem').read_text(),
     "AUDIENCE": None,
     "ISSUER": None,
     "JSON_ENCODER": None,
@@ -149,6 +162,57 @@ DATABASES = {
 }
 
 
+# Uploads processed in the background are stored here until the upload worker picks them up.
+# `python manage.py run_upload_worker`
+
+UPLOAD_JOB_DIR = BASE_DIR / 'upload_jobs'
+
+# running jobs send a heartbeat with every chunk they read. a job without one for this long lost its worker and is
+# queued again, after UPLOAD_JOB_MAX_ATTEMPTS runs it is failed instead.
+UPLOAD_JOB_STALE_AFTER = timedelta(minutes=10)
+UPLOAD_JOB_MAX_ATTEMPTS = 3
+
+# files sent through the chunked upload endpoints are assembled here.
+CHUNKED_UPLOAD_DIR = UPLOAD_JOB_DIR / 'chunked'
+# largest chunked upload, whether its size was declared or not. open uploads without a chunk for this long are
+# removed when another upload starts or by the idle upload worker.
+CHUNKED_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY = timedelta(hours=24)
+
+# an identical file uploaded again by the same user within this time returns the earlier result.
+UPLOAD_FINGERPRINT_TTL = timedelta(hours=24)
+
+# rows per page of `/transactions/view/`, clients may ask for fewer or more up to the maximum with `page_size`.
+TRANSACTION_PAGE_SIZE = 1000
+TRANSACTION_MAX_PAGE_SIZE = 10000
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# progress of running upload jobs lives in a file based cache so the web process can read
+# what the worker process writes while its database transaction is still open.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'jobs': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': UPLOAD_JOB_DIR / 'progress',
+        'TIMEOUT': 24 * 60 * 60,
+    },
+    # rendered `/summary/` and `/transactions/view/` responses, keyed by the user's data version. per process,
+    # to share them between processes use the file based backend instead:
+    # 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'response_cache',
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 10 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
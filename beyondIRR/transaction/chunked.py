@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+import os
+import shutil
+import uuid
+from .models import ChunkedUpload
+
+# request bodies are copied to disk in pieces of this size, a chunk is never held in memory whole.
+COPY_BUFFER_SIZE = 1024 * 1024
+FILENAME_MAX_LENGTH = ChunkedUpload._meta.get_field('filename').max_length
+
+
+class OffsetMismatchError(Exception):
+    def __init__(self, offset):
+        super().__init__(f'Chunk must start at offset {offset}')
+        self.offset = offset
+
+
+class UploadSizeError(Exception):
+    pass
+
+
+# uploads without a declared size may grow up to CHUNKED_UPLOAD_MAX_SIZE bytes.
+def upload_limit(upload):
+    return upload.size if upload.size is not None else settings.CHUNKED_UPLOAD_MAX_SIZE
+
+
+def start_upload(user, filename, content_type='', size=None):
+    if size is not None and size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise UploadSizeError(f'Uploads are limited to {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes')
+    expire_stale_uploads()
+    # the client's filename is only kept for reference, on disk the data has a fixed name.
+    filename = os.path.basename(filename or '') or 'upload'
+    upload = ChunkedUpload(user=user, filename=filename[:FILENAME_MAX_LENGTH], content_type=content_type or '', size=size)
+    upload_dir = os.path.join(settings.CHUNKED_UPLOAD_DIR, str(upload.id))
+    os.makedirs(upload_dir, exist_ok=True)
+    upload.file_path = os.path.join(upload_dir, 'data')
+    open(upload.file_path, 'wb').close()
+    upload.save()
+    return upload
+
+
+# the body is copied to a file of its own first, acknowledged bytes are only touched once the chunk is known to
+# start at the acknowledged offset.
+def stage_chunk(upload, offset, stream):
+    staged = os.path.join(os.path.dirname(upload.file_path), f'.chunk-{uuid.uuid4()}')
+    limit = upload_limit(upload)
+    written = 0
+    try:
+        with open(staged, 'wb') as file:
+            if stream is not None:
+                while True:
+                    data = stream.read(COPY_BUFFER_SIZE)
+                    if not data:
+                        break
+                    written += len(data)
+                    if offset + written > limit:
+                        if upload.size is not None:
+                            raise UploadSizeError(f'Upload is larger than the declared size of {upload.size} bytes')
+                        raise UploadSizeError(f'Uploads are limited to {limit} bytes')
+                    file.write(data)
+    except BaseException:
+        os.remove(staged)
+        raise
+    return staged, written
+
+
+# writes the chunk at `offset`, which must be the last acknowledged offset. bytes past it are left over from
+# a chunk that was cut off before it was acknowledged, they are dropped and written again.
+def append_chunk(upload, offset, stream):
+    if offset != upload.offset:
+        raise OffsetMismatchError(upload.offset)
+
+    staged, written = stage_chunk(upload, offset, stream)
+    try:
+        with db_transaction.atomic():
+            # conditional update, a concurrent request which already moved the offset wins and this chunk is
+            # refused. the row stays locked until the chunk is on disk, a duplicate request waits and is refused.
+            acknowledged = ChunkedUpload.objects.filter(id=upload.id, offset=offset, state='OPEN').update(
+                offset=offset + written, updated_at=timezone.now(),
+            )
+            if not acknowledged:
+                upload.refresh_from_db()
+                raise OffsetMismatchError(upload.offset)
+            with open(upload.file_path, 'r+b') as file, open(staged, 'rb') as chunk:
+                file.seek(offset)
+                file.truncate()
+                shutil.copyfileobj(chunk, file, COPY_BUFFER_SIZE)
+    finally:
+        os.remove(staged)
+    upload.offset = offset + written
+    return upload.offset
+
+
+# open uploads nobody sent a chunk to for CHUNKED_UPLOAD_EXPIRY are removed with their files.
+def expire_stale_uploads():
+    stale = ChunkedUpload.objects.filter(state='OPEN', updated_at__lt=timezone.now() - settings.CHUNKED_UPLOAD_EXPIRY)
+    expired = 0
+    for upload in list(stale.only('id', 'file_path')):
+        # a chunk which arrived in the meantime keeps the upload.
+        if stale.filter(id=upload.id).delete()[0]:
+            remove_upload_file(upload)
+            expired += 1
+    return expired
+
+
+def check_complete(upload):
+    if upload.size is not None and upload.offset != upload.size:
+        raise UploadSizeError(f'Only {upload.offset} of {upload.size} bytes were received')
+
+
+# the assembled file is no longer needed once it was processed (or handed to a job).
+def remove_upload_file(upload):
+    shutil.rmtree(os.path.dirname(upload.file_path), ignore_errors=True)
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.utils import timezone
+import hashlib
+from .models import UploadFingerprint
+from .versions import data_version
+
+
+# sha256 of the uploaded bytes, read chunk by chunk so large files are never held in memory.
+def file_fingerprint(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+# the earlier result of the same file, unless it expired or the user's transactions changed since in any way
+# (another upload, an edit or a delete).
+def recorded_result(user, fingerprint):
+    expires_after = timezone.now() - settings.UPLOAD_FINGERPRINT_TTL
+    record = UploadFingerprint.objects.filter(
+        user=user, sha256=fingerprint, created_at__gte=expires_after, data_version=data_version(user.pk),
+    ).first()
+    return record.result if record else None
+
+
+def record_result(user, fingerprint, result):
+    version = data_version(user.pk)
+    # results recorded at older data versions or expired are never replayed again.
+    expires_after = timezone.now() - settings.UPLOAD_FINGERPRINT_TTL
+    stale = UploadFingerprint.objects.filter(user=user).exclude(sha256=fingerprint)
+    (stale.exclude(data_version=version) | stale.filter(created_at__lt=expires_after)).delete()
+    UploadFingerprint.objects.update_or_create(
+        user=user,
+        sha256=fingerprint,
+        defaults={"result": result, "created_at": timezone.now(), "data_version": version},
+    )
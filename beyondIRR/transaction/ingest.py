@@ -0,0 +1,37 @@
+from django.db import transaction as db_transaction
+from .models import UPLOAD_HEADERS
+from .readers import read_chunks, MissingHeadersError
+from .upsert import upsert_transactions
+from .validation import UploadValidator, UploadValidationError
+
+
+def counted(chunks, progress):
+    rows = 0
+    for chunk in chunks:
+        yield chunk
+        rows += len(chunk)
+        if progress:
+            progress(rows)
+
+
+# read -> validate -> write pipeline shared by direct and background uploads.
+# nothing is written unless every row of the file is valid. progress is called with the rows read so far.
+def ingest_upload(user, file, content_type=None, progress=None):
+    validator = UploadValidator()
+    chunks = read_chunks(file, content_type)
+    with db_transaction.atomic():
+        result = upsert_transactions(user, validator.clean_chunks(counted(chunks, progress)))
+        validator.raise_for_errors()
+
+    result["rows"] = validator.rows
+    result["duplicates"] += validator.duplicates
+    return result
+
+
+# response body for an upload that could not be processed.
+def upload_error(e):
+    if isinstance(e, MissingHeadersError):
+        return {"error": str(e), "necessary headers": UPLOAD_HEADERS}
+    if isinstance(e, UploadValidationError):
+        return {"error": str(e), "error_count": e.error_count, "errors": e.errors}
+    return {"error": str(e)}
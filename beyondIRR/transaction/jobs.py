@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+import os
+import shutil
+from .models import UploadJob
+from .ingest import ingest_upload, upload_error
+from .fingerprints import record_result
+
+
+def progress_key(job_id):
+    return f"upload-job-{job_id}"
+
+
+def heartbeat_key(job_id):
+    return f"upload-job-{job_id}-heartbeat"
+
+
+def heartbeat(job_id):
+    caches['jobs'].set(heartbeat_key(job_id), timezone.now())
+
+
+# copies the uploaded file to disk chunk by chunk and queues it for the upload worker.
+def enqueue_upload(user, file, fingerprint=''):
+    job = UploadJob(user=user, content_type=file.content_type or '', fingerprint=fingerprint)
+    job_dir = os.path.join(settings.UPLOAD_JOB_DIR, str(job.id))
+    os.makedirs(job_dir, exist_ok=True)
+    job.file_path = os.path.join(job_dir, os.path.basename(file.name or 'upload'))
+    with open(job.file_path, 'wb') as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+    job.save()
+    return job
+
+
+# queues a file which is already on disk in a directory of its own, the directory is removed once the job ran.
+def enqueue_file(user, file_path, content_type='', fingerprint=''):
+    return UploadJob.objects.create(user=user, file_path=file_path, content_type=content_type, fingerprint=fingerprint)
+
+
+# running jobs without a heartbeat for UPLOAD_JOB_STALE_AFTER lost their worker, nothing of their upload was
+# committed. they are queued again, or failed and their file removed once they ran UPLOAD_JOB_MAX_ATTEMPTS times.
+# the updates are conditional on started_at, a job claimed again in the meantime is left alone.
+def reclaim_stale_jobs():
+    now = timezone.now()
+    cutoff = now - settings.UPLOAD_JOB_STALE_AFTER
+    reclaimed = []
+    for job in UploadJob.objects.filter(state='RUNNING', started_at__lt=cutoff):
+        beat = caches['jobs'].get(heartbeat_key(job.id))
+        if beat is not None and beat >= cutoff:
+            continue
+        running = UploadJob.objects.filter(id=job.id, state='RUNNING', started_at=job.started_at)
+        if job.attempts < settings.UPLOAD_JOB_MAX_ATTEMPTS:
+            if running.update(state='QUEUED'):
+                reclaimed.append(job.id)
+        elif running.update(state='FAILED', finished_at=now, errors={"error": "The upload worker stopped while processing the upload"}):
+            caches['jobs'].delete_many([progress_key(job.id), heartbeat_key(job.id)])
+            shutil.rmtree(os.path.dirname(job.file_path), ignore_errors=True)
+            reclaimed.append(job.id)
+    return reclaimed
+
+
+# marks the oldest queued job as running, the conditional update keeps two workers from taking the same job.
+def claim_next_job():
+    reclaim_stale_jobs()
+    for job in UploadJob.objects.filter(state='QUEUED').order_by('created_at')[:10]:
+        claimed = UploadJob.objects.filter(id=job.id, state='QUEUED').update(state='RUNNING', started_at=timezone.now(), attempts=F('attempts') + 1)
+        if claimed:
+            heartbeat(job.id)
+            return UploadJob.objects.select_related('user').get(id=job.id)
+    return None
+
+
+def run_job(job):
+    progress = caches['jobs']
+    key = progress_key(job.id)
+    rows_read = 0
+
+    def report(rows):
+        nonlocal rows_read
+        rows_read = rows
+        progress.set(key, rows)
+        heartbeat(job.id)
+
+    try:
+        with open(job.file_path, 'rb') as file:
+            result = ingest_upload(job.user, file, job.content_type, progress=report)
+        job.state = 'DONE'
+        job.inserted = result['inserted']
+        job.updated = result['updated']
+        job.unchanged = result['unchanged']
+        if job.fingerprint:
+            record_result(job.user, job.fingerprint, result)
+    except Exception as e:
+        job.state = 'FAILED'
+        job.errors = upload_error(e)
+
+    job.rows_processed = rows_read
+    job.finished_at = timezone.now()
+    job.save()
+    progress.delete_many([key, heartbeat_key(job.id)])
+    shutil.rmtree(os.path.dirname(job.file_path), ignore_errors=True)
+    return job
+
+
+def run_next_job():
+    job = claim_next_job()
+    if job is None:
+        return None
+    return run_job(job)
+
+
+# rows processed so far, running jobs report through the progress cache until they finish.
+def job_rows_processed(job):
+    if job.state == 'RUNNING':
+        return caches['jobs'].get(progress_key(job.id), 0)
+    return job.rows_processed
+
+
+def job_status(job):
+    rows_processed = job_rows_processed(job)
+    throughput = None
+    if job.started_at:
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+        throughput = round(rows_processed / elapsed, 2) if elapsed > 0 else None
+    return {
+        "id": str(job.id),
+        "state": job.state,
+        "rows_processed": rows_processed,
+        "inserted": job.inserted,
+        "updated": job.updated,
+        "unchanged": job.unchanged,
+        "throughput": throughput,
+        "errors": job.errors,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from io import BytesIO
+import time
+from transaction.readers import read_chunks
+from transaction.synthetic import synthetic_statement, statement_bytes, STATEMENT_FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Compare parse throughput (rows/sec) of every upload format on the same synthetic statement.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='rows in the synthetic statement')
+        parser.add_argument('--formats', nargs='+', default=STATEMENT_FORMATS, choices=STATEMENT_FORMATS)
+        parser.add_argument('--repeat', type=int, default=3, help='best of this many runs is reported')
+
+    def handle(self, *args, **options):
+        df = synthetic_statement(options['rows'])
+        self.stdout.write(f"{'format':<8}{'bytes':>12}{'seconds':>10}{'rows/sec':>12}")
+        for file_format in options['formats']:
+            content = statement_bytes(df, file_format)
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                rows = sum(len(chunk) for chunk in read_chunks(BytesIO(content)))
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(f"{file_format:<8}{len(content):>12}{best:>10.3f}{rows / best:>12.0f}")
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+import json
+import time
+from assets.models import User
+from transaction.models import Transaction, TransactionSerializer
+from transaction.serializers import ValuesSerializer
+from transaction.synthetic import synthetic_statement
+from transaction.upsert import upsert_transactions
+from transaction.validation import UploadValidator
+
+
+class Command(BaseCommand):
+    help = ('Compare TransactionSerializer with the values_list() serializer of /transactions/view/ on synthetic '
+            'transactions in a throwaway test database. Both outputs are checked to render the same bytes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3, help='best of this many runs is reported')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            user = User.objects.create(arn_number=1, email="benchmark@example.com", first_name="Benchmark")
+            results = [self.compare(user, rows, options['repeat']) for rows in options['rows']]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps({"results": results}, indent=2))
+
+    def compare(self, user, rows, repeat):
+        Transaction.objects.filter(user=user).delete()
+        upsert_transactions(user, UploadValidator().clean_chunks([synthetic_statement(rows)]))
+        queryset = Transaction.objects.filter(user=user).order_by('date_of_transaction', 'id')
+
+        def model_serializer():
+            return JSONRenderer().render(TransactionSerializer(queryset.all(), many=True).data)
+
+        def values_serializer():
+            serializer = ValuesSerializer(TransactionSerializer)
+            return JSONRenderer().render(serializer.to_representation(serializer.values(queryset.all())))
+
+        model_seconds, expected = self.best(model_serializer, repeat)
+        values_seconds, fast = self.best(values_serializer, repeat)
+        if fast != expected:
+            raise CommandError(f'values serializer output differs from TransactionSerializer at {rows} rows')
+        return {
+            "rows": rows,
+            "bytes": len(expected),
+            "model_serializer_seconds": round(model_seconds, 4),
+            "values_serializer_seconds": round(values_seconds, 4),
+            "speedup": round(model_seconds / values_seconds, 2),
+        }
+
+    # query, serialization and rendering of the whole list.
+    def best(self, run, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
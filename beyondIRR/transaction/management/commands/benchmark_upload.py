@@ -0,0 +1,120 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+import django
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from assets.models import User
+from transaction.models import Transaction, UploadFingerprint
+from transaction.synthetic import synthetic_statement, statement_file, STATEMENT_FORMATS
+from transaction.views import AddTransactionView
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Benchmark AddTransactionView on synthetic statements in a throwaway test database. '
+            'Reports rows/sec, peak traced memory and query count per size and format as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help='statement sizes, 1k to 1M rows')
+        parser.add_argument('--formats', nargs='+', default=['xlsx', 'csv'], choices=STATEMENT_FORMATS)
+        parser.add_argument('--output', help='also write the JSON results to this file')
+        parser.add_argument('--no-memory', action='store_true', help='do not trace memory, tracing slows the upload down')
+
+    def handle(self, *args, **options):
+        # uploads run against a fresh test database, never against real data.
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = [
+                self.run_upload(rows, file_format, scenario, not options['no_memory'])
+                for rows in options['rows']
+                for file_format in options['formats']
+                for scenario in ('insert', 'update')
+            ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = json.dumps({"environment": self.environment(), "results": results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(report)
+        self.stdout.write(report)
+
+    # insert uploads into an empty table, update re-uploads the same rows with other amounts. memory is traced
+    # in a second upload of its own as tracing slows the upload down several times.
+    def run_upload(self, rows, file_format, scenario, trace_memory):
+        user, _ = User.objects.get_or_create(arn_number=1, defaults={"email": "benchmark@example.com", "first_name": "Benchmark"})
+        token = str(RefreshToken.for_user(user).access_token)
+
+        response, elapsed, queries, size = self.measure(user, token, rows, file_format, scenario, False)
+        peak = self.measure(user, token, rows, file_format, scenario, True)[2] if trace_memory else None
+        return {
+            "rows": rows,
+            "format": file_format,
+            "scenario": scenario,
+            "bytes": size,
+            "status": response.status_code,
+            "inserted": response.data.get('inserted'),
+            "updated": response.data.get('updated'),
+            "seconds": round(elapsed, 4),
+            "rows_per_sec": round(rows / elapsed, 1),
+            "peak_memory_bytes": peak,
+            "queries": queries,
+        }
+
+    # (response, seconds, peak traced memory or query count, file size) of one upload.
+    def measure(self, user, token, rows, file_format, scenario, trace_memory):
+        UploadFingerprint.objects.filter(user=user).delete()
+        if scenario == 'insert':
+            Transaction.objects.filter(user=user).delete()
+            seed = 0
+        else:
+            # amounts differ from whatever the previous upload stored.
+            self.seed = getattr(self, 'seed', 0) + 1
+            seed = self.seed
+
+        file = statement_file(synthetic_statement(rows, seed), file_format)
+        request = APIRequestFactory().post('/transactions/upload/', {'file': file}, format='multipart', HTTP_AUTHORIZATION='Bearer ' + token)
+        view = AddTransactionView.as_view()
+
+        if trace_memory:
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = view(request)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return response, elapsed, peak, len(file.getvalue())
+
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = view(request)
+        elapsed = time.perf_counter() - start
+        return response, elapsed, queries.count, len(file.getvalue())
+
+    def environment(self):
+        return {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "database": connection.vendor,
+            "cpu_count": os.cpu_count(),
+            "platform": sys.platform,
+        }
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+import json
+import math
+import time
+import numpy as np
+from transaction.xirr import xirr, scalar_xirr
+
+
+class Command(BaseCommand):
+    help = ('Compare the batched NumPy XIRR solver of /returns/ with the scalar reference solving one series at a '
+            'time, on synthetic cash flows. Both are checked to find the same rates.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--series', type=int, nargs='+', default=[100, 1000, 10000], help='number of products solved at once')
+        parser.add_argument('--flows', type=int, default=50, help='cash flows of every product')
+        parser.add_argument('--repeat', type=int, default=3, help='best of this many runs is reported')
+
+    def handle(self, *args, **options):
+        results = [self.compare(series, options['flows'], options['repeat']) for series in options['series']]
+        self.stdout.write(json.dumps({"results": results}, indent=2))
+
+    def compare(self, series, flows, repeat):
+        groups, days, amounts = self.cash_flows(series, flows)
+        # the reference gets plain lists per series, like a loop over products would build them.
+        per_series = [(days[groups == group].tolist(), amounts[groups == group].tolist()) for group in range(series)]
+
+        vectorized_seconds, rates = self.best(lambda: xirr(groups, days, amounts, series), repeat)
+        scalar_seconds, expected = self.best(lambda: [scalar_xirr(*flows) for flows in per_series], repeat)
+        for group, (rate, want) in enumerate(zip(rates, expected)):
+            if math.isnan(rate) != math.isnan(want) or abs(rate - want) > 1e-6 * max(1, abs(want)):
+                raise CommandError(f'batched rate {rate} differs from the reference {want} for series {group}')
+        return {
+            "series": series,
+            "flows": series * flows,
+            "unsolvable": int(np.isnan(rates).sum()),
+            "scalar_seconds": round(scalar_seconds, 4),
+            "vectorized_seconds": round(vectorized_seconds, 4),
+            "speedup": round(scalar_seconds / vectorized_seconds, 2),
+        }
+
+    # monthly investments from a random start and a closing value at a random annual return, the shape of a statement.
+    def cash_flows(self, series, flows, seed=0):
+        rng = np.random.default_rng(seed)
+        groups = np.repeat(np.arange(series), flows)
+        position = np.tile(np.arange(flows), series)
+        days = rng.integers(0, 5 * 365, series)[groups] + position * 30
+        amounts = -rng.uniform(1000, 10000, series * flows)
+        last = position == flows - 1
+        # the closing value grows every investment at the series' rate until the last day.
+        rate = rng.uniform(-0.2, 0.3, series)[groups]
+        years = (days[last][groups] - days) / 365.0
+        closing = np.bincount(groups, -amounts * (1 + rate) ** years * ~last, minlength=series)
+        amounts[last] = closing
+        return groups, days, amounts
+
+    def best(self, run, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+from transaction.summary import rebuild_summaries, summary_mismatches
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the financial year summary table from the transactions, or with --verify only check it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='compare the table with the transactions without changing it')
+        parser.add_argument('--user', type=int, nargs='+', help='ARN numbers of the users to rebuild or verify, everyone by default')
+
+    def handle(self, *args, **options):
+        users = options['user']
+        if options['verify']:
+            mismatches = summary_mismatches(users)
+            for user_id, year, asset_class, expected, stored in mismatches:
+                self.stdout.write(f"user {user_id} FY{year} {asset_class}: expected (amount, transactions) {expected}, stored {stored}")
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} summary rows do not match the transactions')
+            self.stdout.write('Summary table matches the transactions.')
+            return
+
+        with db_transaction.atomic():
+            rows = rebuild_summaries(users)
+        self.stdout.write(f'Rebuilt {rows} summary rows.')
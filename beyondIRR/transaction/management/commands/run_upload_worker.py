@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+import time
+from transaction.jobs import run_next_job
+from transaction.chunked import expire_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Process queued background uploads from the UploadJob table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='process the queued jobs and exit')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            job = run_next_job()
+            if job is not None:
+                self.stdout.write(f"{job.id} {job.state} {job.rows_processed} rows")
+                continue
+            expire_stale_uploads()
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
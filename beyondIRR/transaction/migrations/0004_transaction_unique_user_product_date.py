@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-18 06:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# rows saved before the constraint existed can repeat (user, product, date), keep one of each.
+def remove_duplicate_transactions(apps, schema_editor):
+    Transaction = apps.get_model('transaction', 'Transaction')
+    duplicates = (
+        Transaction.objects.values('user', 'product', 'date_of_transaction')
+        .annotate(rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        ids = list(
+            Transaction.objects.filter(
+                user=duplicate['user'],
+                product=duplicate['product'],
+                date_of_transaction=duplicate['date_of_transaction'],
+            ).values_list('id', flat=True)
+        )
+        Transaction.objects.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0003_alter_transaction_date_of_transaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_transactions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('user', 'product', 'date_of_transaction'), name='unique_user_product_date'),
+        ),
+    ]
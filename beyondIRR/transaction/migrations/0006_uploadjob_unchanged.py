@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0005_uploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='unchanged',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-18 07:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+ASSET_CHOICES = (
+    ("EQUITY", "Equity"),
+    ("DEBT", "Debt"),
+    ("ALTERNATE", "Alternate"),
+)
+
+
+# older rows store the asset class label, store the choice key like uploads do so the asset class filter
+# is a single range of the index.
+def store_asset_class_keys(apps, schema_editor):
+    Transaction = apps.get_model('transaction', 'Transaction')
+    for key, label in ASSET_CHOICES:
+        Transaction.objects.filter(asset_class=label).update(asset_class=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0008_chunkedupload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(store_asset_class_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date_of_transaction', 'id'], name='transaction_user_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'asset_class', 'date_of_transaction', 'id'], name='transaction_user_asset_date'),
+        ),
+    ]
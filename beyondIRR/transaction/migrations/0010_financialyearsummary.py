@@ -0,0 +1,55 @@
+# Generated by Django 5.1 on 2026-10-18 07:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from decimal import Decimal
+import zoneinfo
+
+
+# totals of the transactions already stored, by financial year (1 April, Indian time) and asset class key.
+def build_financial_year_summary(apps, schema_editor):
+    Transaction = apps.get_model('transaction', 'Transaction')
+    FinancialYearSummary = apps.get_model('transaction', 'FinancialYearSummary')
+    india = zoneinfo.ZoneInfo('Asia/Kolkata')
+    keys = {"Equity": "EQUITY", "Debt": "DEBT", "Alternate": "ALTERNATE"}
+    totals = {}
+    rows = Transaction.objects.values_list('user_id', 'date_of_transaction', 'asset_class', 'amount')
+    for user_id, date, asset_class, amount in rows.iterator(chunk_size=5000):
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        date = date.astimezone(india)
+        key = (user_id, date.year - (1 if date.month < 4 else 0), keys.get(asset_class, asset_class))
+        total, count = totals.get(key, (Decimal(0), 0))
+        totals[key] = (total + amount, count + 1)
+    FinancialYearSummary.objects.bulk_create([
+        FinancialYearSummary(user_id=user_id, fiscal_year=year, asset_class=asset_class, amount=total, transactions=count)
+        for (user_id, year, asset_class), (total, count) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0009_transaction_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinancialYearSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fiscal_year', models.IntegerField()),
+                ('asset_class', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('transactions', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'fiscal_year', 'asset_class'), name='unique_user_year_asset')],
+            },
+        ),
+        migrations.RunPython(build_financial_year_summary, migrations.RunPython.noop),
+    ]
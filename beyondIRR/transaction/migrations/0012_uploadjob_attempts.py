@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0011_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0012_uploadjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadfingerprint',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
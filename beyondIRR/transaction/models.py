@@ -1,4 +1,5 @@
 from django.db import models
+from django.db import transaction as db_transaction
 from assets.models import User
 from rest_framework import serializers
 import uuid
@@ -10,9 +11,47 @@ ASSET_CHOICES = (
     ("DEBT", "Debt"),
     ("ALTERNATE", "Alternate")
 )
+ASSET_LABELS = dict(ASSET_CHOICES)
 
+# headers every uploaded statement must carry.
+UPLOAD_HEADERS = ['Product', 'Asset Class', 'Date', 'Amount', 'Units']
 
 
+
+class TransactionQuerySet(models.QuerySet):
+    # rows deleted in bulk are taken out of the financial year summary with one grouped query.
+    def delete(self):
+        from .summary import remove_from_summary
+        from .versions import bump_data_version
+        with db_transaction.atomic():
+            for user_id in remove_from_summary(self):
+                bump_data_version(user_id)
+            return super().delete()
+
+    # rows updated in bulk are taken out of the summary and added back as updated, by primary key as the
+    # update may change the columns the queryset filters on.
+    def update(self, **kwargs):
+        from .summary import SUMMARY_FIELDS, remove_from_summary, grouped_totals, apply_summary_deltas
+        from .versions import bump_data_version
+        with db_transaction.atomic():
+            if not any(field in kwargs for field in (*SUMMARY_FIELDS, 'user', 'user_id')):
+                user_ids = set(self.values_list('user_id', flat=True).distinct())
+                updated = super().update(**kwargs)
+            else:
+                rows = Transaction.objects.filter(pk__in=list(self.values_list('pk', flat=True)))
+                user_ids = set(remove_from_summary(rows))
+                updated = super().update(**kwargs)
+                for user_id, deltas in grouped_totals(rows).items():
+                    apply_summary_deltas(user_id, deltas)
+                    user_ids.add(user_id)
+            for user_id in user_ids:
+                bump_data_version(user_id)
+            return updated
+
+
+# save(), delete() and queryset update() and delete() keep FinancialYearSummary and DataVersion in step in the
+# same database transaction. bulk_create() skips them, writers using it apply the summary deltas and bump the
+# data version themselves (see upsert_transactions).
 class Transaction(models.Model):
     id = models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True)
     user = models.ForeignKey(to=User, on_delete=models.CASCADE)
@@ -22,11 +61,150 @@ class Transaction(models.Model):
     units = models.DecimalField(default=0, decimal_places=4, max_digits=10)
     amount = models.DecimalField(default=0, decimal_places=4, max_digits=10)
 
+    class Meta:
+        constraints = [
+            # each product can only have one transaction per day for a user.
+            models.UniqueConstraint(fields=['user', 'product', 'date_of_transaction'], name='unique_user_product_date'),
+        ]
+        indexes = [
+            # pages of `/transactions/view/` are range scans in (date_of_transaction, id) order, the product
+            # filter uses the unique constraint above as (product, date) is unique for a user.
+            models.Index(fields=['user', 'date_of_transaction', 'id'], name='transaction_user_date_id'),
+            models.Index(fields=['user', 'asset_class', 'date_of_transaction', 'id'], name='transaction_user_asset_date'),
+        ]
+
+    objects = TransactionQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.id}"
+
+    def save(self, *args, **kwargs):
+        from .summary import SUMMARY_FIELDS, record_saved_transaction
+        from .versions import bump_data_version
+        with db_transaction.atomic():
+            before = None
+            if not self._state.adding:
+                before = Transaction.objects.filter(pk=self.pk).values_list(*SUMMARY_FIELDS).first()
+            super().save(*args, **kwargs)
+            record_saved_transaction(self, before, kwargs.get('update_fields'))
+            bump_data_version(self.user_id)
+
+    def delete(self, *args, **kwargs):
+        from .summary import remove_from_summary
+        from .versions import bump_data_version
+        with db_transaction.atomic():
+            remove_from_summary(Transaction.objects.filter(pk=self.pk))
+            bump_data_version(self.user_id)
+            return super().delete(*args, **kwargs)
     
 
+# totals of a user's transactions in one financial year and asset class, kept in step with Transaction so
+# `/summary/` is one indexed read. fiscal_year is the calendar year the financial year starts in.
+class FinancialYearSummary(models.Model):
+    user = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    fiscal_year = models.IntegerField()
+    asset_class = models.CharField(max_length=100)
+    amount = models.DecimalField(default=0, decimal_places=4, max_digits=20)
+    transactions = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'fiscal_year', 'asset_class'], name='unique_user_year_asset'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.fiscal_year} - {self.asset_class}"
+
+
+# bumped in the same database transaction as every change to a user's transactions, cached responses and
+# ETags carry it so they are never served for older data.
+class DataVersion(models.Model):
+    user = models.OneToOneField(to=User, on_delete=models.CASCADE, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.version}"
+
+
 class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
-        fields = ['id', 'user', 'product', 'asset_class', 'date_of_transaction', 'units', 'amount']
\ No newline at end of file
+        fields = ['id', 'user', 'product', 'asset_class', 'date_of_transaction', 'units', 'amount']
+
+JOB_STATES = (
+    ("QUEUED", "Queued"),
+    ("RUNNING", "Running"),
+    ("DONE", "Done"),
+    ("FAILED", "Failed")
+)
+
+
+# upload stored on disk and waiting for (or processed by) the upload worker.
+class UploadJob(models.Model):
+    id = models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True)
+    user = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    file_path = models.CharField(max_length=1000)
+    content_type = models.CharField(default='', max_length=100)
+    fingerprint = models.CharField(default='', max_length=64)
+    state = models.CharField(default='QUEUED', choices=JOB_STATES, max_length=10)
+    rows_processed = models.IntegerField(default=0)
+    inserted = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    unchanged = models.IntegerField(default=0)
+    errors = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # times a worker claimed the job, a job whose worker stopped is claimed again up to UPLOAD_JOB_MAX_ATTEMPTS.
+    attempts = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # worker picks the oldest queued job.
+            models.Index(fields=['state', 'created_at'], name='uploadjob_state_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.id} - {self.state}"
+
+
+# sha256 of an upload already processed for the user, an identical re-upload gets the stored result back.
+class UploadFingerprint(models.Model):
+    id = models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True)
+    user = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    sha256 = models.CharField(max_length=64)
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # DataVersion of the user once the upload was written, the result only holds while it is unchanged.
+    data_version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'sha256'], name='unique_user_upload_fingerprint'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.sha256}"
+
+
+CHUNKED_UPLOAD_STATES = (
+    ("OPEN", "Open"),
+    ("FINALIZED", "Finalized")
+)
+
+
+# file sent in pieces, bytes up to `offset` are on disk and acknowledged to the client.
+class ChunkedUpload(models.Model):
+    id = models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True)
+    user = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    filename = models.CharField(default='upload', max_length=255)
+    content_type = models.CharField(default='', max_length=100)
+    file_path = models.CharField(max_length=1000)
+    size = models.BigIntegerField(null=True, blank=True)
+    offset = models.BigIntegerField(default=0)
+    state = models.CharField(default='OPEN', choices=CHUNKED_UPLOAD_STATES, max_length=10)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.id} - {self.offset}"
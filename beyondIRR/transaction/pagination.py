@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+import base64
+import datetime
+import json
+from operator import attrgetter
+import uuid
+from .models import ASSET_LABELS
+from .validation import ASSET_CLASS_KEYS
+
+# pages are ordered by (date_of_transaction, id), the cursor is the position of the last row of a page.
+ORDERING = ('date_of_transaction', 'id')
+
+
+class InvalidQueryError(Exception):
+    pass
+
+
+def encode_cursor(date, id):
+    position = json.dumps([date.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        date, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        date = datetime.datetime.fromisoformat(date)
+        return date, uuid.UUID(id)
+    except (ValueError, TypeError):
+        raise InvalidQueryError('cursor is invalid')
+
+
+# None when the value is not shaped like a datetime, well formed but impossible ones (Feb 30) are an error.
+def parse_moment(value, name):
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        raise InvalidQueryError(f'{name} is not a valid datetime')
+
+
+# `date_from`/`date_to` take a date or a datetime, both ends are inclusive and a date covers the whole day.
+def parse_bound(value, name, end=False):
+    moment = parse_moment(value, name)
+    if moment is None:
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise InvalidQueryError(f'{name} must be a date (YYYY-MM-DD) or a datetime')
+        moment = datetime.datetime.combine(day + datetime.timedelta(days=1) if end else day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_transactions(queryset, params):
+    if params.get('date_from'):
+        queryset = queryset.filter(date_of_transaction__gte=parse_bound(params['date_from'], 'date_from'))
+    if params.get('date_to'):
+        date_to = params['date_to']
+        if parse_moment(date_to, 'date_to') is None:
+            queryset = queryset.filter(date_of_transaction__lt=parse_bound(date_to, 'date_to', end=True))
+        else:
+            queryset = queryset.filter(date_of_transaction__lte=parse_bound(date_to, 'date_to'))
+    if params.get('product'):
+        queryset = queryset.filter(product=params['product'])
+    if params.get('asset_class'):
+        key = ASSET_CLASS_KEYS.get(params['asset_class'].strip().lower())
+        if key is None:
+            raise InvalidQueryError('asset_class must be one of ' + ', '.join(ASSET_LABELS.values()))
+        queryset = queryset.filter(asset_class=key)
+    return queryset
+
+
+def page_size(params):
+    try:
+        size = int(params.get('page_size', settings.TRANSACTION_PAGE_SIZE))
+    except ValueError:
+        raise InvalidQueryError('page_size must be a number')
+    if size < 1:
+        raise InvalidQueryError('page_size must be at least 1')
+    return min(size, settings.TRANSACTION_MAX_PAGE_SIZE)
+
+
+# rows after the cursor and the cursor of the next page (None on the last page). the condition is written as
+# date >= d and not (date = d and id <= i) so the database walks the (user, date, id) index from the cursor
+# on, a deep page costs the same as the first one. `position` gives the (date, id) of a row, rows are model
+# instances unless told otherwise.
+def keyset_page(queryset, cursor, size, position=attrgetter(*ORDERING)):
+    if cursor:
+        date, id = decode_cursor(cursor)
+        queryset = queryset.filter(date_of_transaction__gte=date).exclude(date_of_transaction=date, id__lte=id)
+    rows = list(queryset.order_by(*ORDERING)[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(*position(rows[-1]))
+
+
+# `arn_numbers` is a comma separated list, repeated parameters add to it. None when it is not given.
+def parse_arn_numbers(params):
+    if not params.getlist('arn_numbers'):
+        return None
+    values = [value.strip() for param in params.getlist('arn_numbers') for value in param.split(',') if value.strip()]
+    try:
+        return sorted({int(value) for value in values})
+    except ValueError:
+        raise InvalidQueryError('arn_numbers must be a comma separated list of ARN numbers')
@@ -0,0 +1,175 @@
+from openpyxl import load_workbook
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import chain, islice
+import codecs
+import gzip
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import pandas as pd
+from .models import UPLOAD_HEADERS
+from .sheets import MissingHeadersError, header_positions, row_chunks, sheet_chunks, parse_sheet
+
+# rows handed to the writer at a time. the readers hold a few chunks of this size, not the whole sheet.
+READ_CHUNK_SIZE = 5000
+# processes parsing the sheets of a multi-sheet workbook.
+PARSE_WORKERS = os.cpu_count() or 1
+# forkserver where the platform has it, spawn elsewhere (Windows).
+PARSE_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# explicit dtypes keep the C parser from guessing column types chunk by chunk, values are
+# read as text and coerced column-wise by the validation stage so one bad cell does not fail the file.
+CSV_DTYPES = {header: str for header in UPLOAD_HEADERS}
+
+CONTENT_TYPES = {
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'xlsx',
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'text/tab-separated-values': 'tsv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/json-lines': 'jsonl',
+    'application/gzip': 'gzip',
+    'application/x-gzip': 'gzip',
+}
+
+XLSX_MAGIC = b'PK\x03\x04'
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def excel_chunks(workbook, rows, positions, chunk_size):
+    try:
+        yield from row_chunks(rows, positions, UPLOAD_HEADERS, chunk_size)
+    finally:
+        workbook.close()
+
+
+# pool processes open the workbook themselves, from the temporary file Django spooled large uploads to
+# or from the bytes of small ones.
+def excel_source(file):
+    if hasattr(file, 'temporary_file_path'):
+        return file.temporary_file_path()
+    if isinstance(file, io.BufferedReader):
+        return file.name
+    file.seek(0)
+    return file.read()
+
+
+# sheets are parsed on a process pool and handed out in sheet order, at most `workers` sheets
+# are parsed or waiting at a time so memory stays bounded by a few sheets.
+def parallel_sheet_chunks(source, sheets, chunk_size, workers):
+    # a pool of one only adds process overhead.
+    if workers == 1:
+        for sheet in sheets:
+            yield from sheet_chunks(source, sheet, UPLOAD_HEADERS, chunk_size)
+        return
+
+    # workers spill their chunks to disk and only paths come back, so memory holds a chunk per worker and
+    # the one being written, never a whole sheet. forkserver workers start clean instead of copying this
+    # process with its open connections and threads.
+    directory = tempfile.mkdtemp(prefix='sheets-')
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(PARSE_START_METHOD))
+    try:
+        sheets = iter(sheets)
+        pending = deque(pool.submit(parse_sheet, source, sheet, UPLOAD_HEADERS, chunk_size, directory)
+                        for sheet in islice(sheets, workers))
+        while pending:
+            paths = pending.popleft().result()
+            for sheet in islice(sheets, 1):
+                pending.append(pool.submit(parse_sheet, source, sheet, UPLOAD_HEADERS, chunk_size, directory))
+            for path in paths:
+                chunk = pd.read_pickle(path)
+                os.remove(path)
+                yield chunk
+    finally:
+        pool.shutdown(cancel_futures=True)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# streams an Excel file as dataframes of at most chunk_size rows. a single sheet is read in this process and
+# its header row is checked right away so a bad file fails before anything is written, workbooks with many
+# sheets (e.g. one per fund house) are parsed sheet by sheet in parallel and merged in sheet order.
+def read_excel_chunks(file, chunk_size=READ_CHUNK_SIZE, workers=PARSE_WORKERS):
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    if len(workbook.sheetnames) > 1:
+        sheets = workbook.sheetnames
+        workbook.close()
+        return parallel_sheet_chunks(excel_source(file), sheets, chunk_size, min(workers, len(sheets)))
+
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        positions = header_positions(next(rows, ()), UPLOAD_HEADERS)
+    except Exception:
+        workbook.close()
+        raise
+    return excel_chunks(workbook, rows, positions, chunk_size)
+
+
+def selected_chunks(chunks):
+    for chunk in chunks:
+        yield chunk[UPLOAD_HEADERS]
+
+
+# pandas readers only know the columns once the first chunk is parsed, check them before handing it out.
+def checked_chunks(chunks):
+    first = next(chunks, None)
+    if first is None:
+        raise MissingHeadersError('One or More Necessary Header Missing')
+    header_positions(first.columns, UPLOAD_HEADERS)
+    return selected_chunks(chain([first], chunks))
+
+
+def read_csv_chunks(file, sep=',', chunk_size=READ_CHUNK_SIZE):
+    chunks = pd.read_csv(file, sep=sep, engine='c', dtype=CSV_DTYPES, chunksize=chunk_size)
+    return checked_chunks(iter(chunks))
+
+
+def read_jsonl_chunks(file, chunk_size=READ_CHUNK_SIZE):
+    # the line reader of pandas joins str lines, so bytes from uploads are decoded on the way.
+    file = codecs.getreader('utf-8')(file)
+    # read without dtypes, a str dtype would turn null into the text "None". values are left as parsed and coerced
+    # by the validation stage like CSV text, nulls stay missing.
+    chunks = pd.read_json(file, lines=True, dtype=False, convert_dates=False, chunksize=chunk_size)
+    return checked_chunks(chunk.astype(object).where(chunk.notna()) for chunk in chunks)
+
+
+# plain text formats are told apart by their first line.
+def sniff_text_format(file):
+    first_line = file.readline()
+    file.seek(0)
+    if first_line.lstrip().startswith(b'{'):
+        return 'jsonl'
+    if b'\t' in first_line:
+        return 'tsv'
+    return 'csv'
+
+
+# magic bytes win over the content type the client sent, which is only a hint for text formats.
+def detect_format(file, content_type=None):
+    head = file.read(4)
+    file.seek(0)
+    if head.startswith(XLSX_MAGIC):
+        return 'xlsx'
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if CONTENT_TYPES.get(content_type) in ('csv', 'tsv', 'jsonl'):
+        return CONTENT_TYPES[content_type]
+    return sniff_text_format(file)
+
+
+# picks the parser for an uploaded statement, gzip files are parsed by what they decompress to.
+def read_chunks(file, content_type=None, chunk_size=READ_CHUNK_SIZE):
+    file_format = detect_format(file, content_type)
+    if file_format == 'gzip':
+        file = gzip.GzipFile(fileobj=file)
+        file_format = sniff_text_format(file)
+
+    if file_format == 'xlsx':
+        return read_excel_chunks(file, chunk_size)
+    if file_format == 'jsonl':
+        return read_jsonl_chunks(file, chunk_size)
+    return read_csv_chunks(file, '\t' if file_format == 'tsv' else ',', chunk_size)
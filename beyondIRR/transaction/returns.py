@@ -0,0 +1,45 @@
+from django.utils import timezone
+import numpy as np
+import pandas as pd
+from .models import Transaction, ASSET_LABELS
+from .summary import asset_class_key
+from .xirr import xirr
+
+# decimals kept of a rate, 0.123456 is 12.3456% a year.
+RATE_PLACES = 6
+
+
+def rate_value(rate):
+    return None if np.isnan(rate) else round(float(rate), RATE_PLACES)
+
+
+# cash flows of the user as arrays: product and asset class key of every flow, its day number in project time
+# and its signed amount.
+def cash_flows(user):
+    rows = Transaction.objects.filter(user_id=user.pk).values_list('product', 'asset_class', 'date_of_transaction', 'amount')
+    products, asset_classes, dates, amounts = zip(*rows) if rows else ((), (), (), ())
+    dates = pd.to_datetime(list(dates), utc=True).tz_convert(timezone.get_current_timezone()).tz_localize(None)
+    days = dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+    asset_classes = [asset_class_key(asset_class) for asset_class in asset_classes]
+    return products, asset_classes, days, np.array(amounts, dtype=float)
+
+
+# XIRR of every product, every asset class and the whole portfolio of the user in one batched solve.
+# the amounts are the cash flows as recorded, money put in negative and money taken out (or a closing
+# valuation entered as a transaction) positive. rates without a solution (flows of one sign) are null.
+def user_returns(user):
+    products, asset_classes, days, amounts = cash_flows(user)
+    product_codes, product_names = pd.factorize(pd.Index(products, dtype=object), sort=True)
+    class_codes, class_keys = pd.factorize(pd.Index(asset_classes, dtype=object), sort=True)
+
+    # product series first, then asset classes, then the portfolio; every flow is in one of each.
+    classes_start = len(product_names)
+    portfolio = classes_start + len(class_keys)
+    groups = np.concatenate([product_codes, classes_start + class_codes, np.full(len(amounts), portfolio)])
+    rates = xirr(groups, np.tile(days, 3), np.tile(amounts, 3), portfolio + 1)
+
+    return {
+        "portfolio": rate_value(rates[portfolio]),
+        "asset_classes": {ASSET_LABELS.get(key, key): rate_value(rates[classes_start + code]) for code, key in enumerate(class_keys)},
+        "products": {name: rate_value(rates[code]) for code, name in enumerate(product_names)},
+    }
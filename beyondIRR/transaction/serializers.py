@@ -0,0 +1,89 @@
+from rest_framework import serializers
+from rest_framework.fields import ISO_8601
+from rest_framework.settings import api_settings
+import datetime
+import decimal
+from functools import lru_cache
+
+
+def decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(quantum, rounding=rounding, context=context))
+    return convert
+
+
+def datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    # statements repeat the same few dates over many rows.
+    @lru_cache(maxsize=4096)
+    def convert(value):
+        # naive values and out of range conversions are left to the field and its error handling.
+        if not isinstance(value, datetime.datetime) or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+# function turning a database value into what `field.to_representation` returns for it, with the field
+# settings looked up once instead of for every row. fields without a fast path use to_representation.
+def value_converter(field):
+    if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+        return str
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return lambda value: value
+    if isinstance(field, serializers.ChoiceField):
+        choices = field.choice_strings_to_values
+        return lambda value: choices.get(str(value), value)
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.DecimalField):
+        return decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return datetime_converter(field)
+    return field.to_representation
+
+
+# read only serializer built on values_list() rows, renders exactly what `serializer_class` renders for the
+# same rows without creating model instances or walking the fields of every row. only `fields` (all when None)
+# are selected and rendered, `columns` are selected as well but not rendered (e.g. the ordering columns a
+# cursor needs).
+class ValuesSerializer:
+    def __init__(self, serializer_class, fields=None, columns=()):
+        declared = serializer_class().fields
+        self.fields = list(fields or declared)
+        sources = [declared[name].source for name in self.fields]
+        self.columns = sources + [column for column in columns if column not in sources]
+        self.converters = [value_converter(declared[name]) for name in self.fields]
+
+    def values(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    # position of a selected column in the rows.
+    def index(self, column):
+        return self.columns.index(column)
+
+    def to_representation(self, rows):
+        fields = self.fields
+        converters = self.converters
+        return [
+            {name: None if value is None else convert(value) for name, convert, value in zip(fields, converters, row)}
+            for row in rows
+        ]
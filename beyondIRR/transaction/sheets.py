@@ -0,0 +1,79 @@
+from openpyxl import load_workbook
+from io import BytesIO
+import os
+import tempfile
+import pandas as pd
+
+# Excel parsing kept free of Django imports, sheets of a workbook are parsed by pool processes
+# which only need openpyxl and pandas.
+
+
+class MissingHeadersError(Exception):
+    pass
+
+
+# position of every necessary header in the header row.
+def header_positions(header_row, headers, sheet=None):
+    header_row = [str(cell) if cell is not None else '' for cell in header_row]
+    for header in headers:
+        if header not in header_row:
+            message = 'One or More Necessary Header Missing'
+            raise MissingHeadersError(f'{message} in sheet {sheet}' if sheet else message)
+    return [header_row.index(header) for header in headers]
+
+
+# dataframes of at most chunk_size rows, attrs carry the sheet and the row number of every row
+# in it (header being row 1) for the error report.
+def row_chunks(rows, positions, headers, chunk_size, sheet=None):
+    chunk, row_numbers = [], []
+    for row_number, row in enumerate(rows, start=2):
+        values = [row[position] if position < len(row) else None for position in positions]
+        # read-only sheets often report trailing rows which are completely empty.
+        if all(value is None for value in values):
+            continue
+        chunk.append(values)
+        row_numbers.append(row_number)
+        if len(chunk) >= chunk_size:
+            yield sheet_frame(chunk, row_numbers, headers, sheet)
+            chunk, row_numbers = [], []
+    if chunk:
+        yield sheet_frame(chunk, row_numbers, headers, sheet)
+
+
+def sheet_frame(chunk, row_numbers, headers, sheet):
+    df = pd.DataFrame(chunk, columns=headers)
+    df.attrs['rows'] = row_numbers
+    if sheet:
+        df.attrs['sheet'] = sheet
+    return df
+
+
+def open_workbook(source):
+    return load_workbook(BytesIO(source) if isinstance(source, bytes) else source, read_only=True, data_only=True)
+
+
+# every chunk of one sheet, read lazily. source is a file path or the file bytes.
+# completely empty sheets give no chunks.
+def sheet_chunks(source, sheet, headers, chunk_size):
+    workbook = open_workbook(source)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None or all(cell is None for cell in header_row):
+            return
+        positions = header_positions(header_row, headers, sheet)
+        yield from row_chunks(rows, positions, headers, chunk_size, sheet)
+    finally:
+        workbook.close()
+
+
+# run in a pool process, writes every chunk of one sheet to its own pickle in directory as soon as it
+# is parsed and returns the paths in order. a worker holds one chunk at a time, not the whole sheet.
+def parse_sheet(source, sheet, headers, chunk_size, directory):
+    paths = []
+    for chunk in sheet_chunks(source, sheet, headers, chunk_size):
+        fd, path = tempfile.mkstemp(suffix='.pkl', dir=directory)
+        os.close(fd)
+        chunk.to_pickle(path)
+        paths.append(path)
+    return paths
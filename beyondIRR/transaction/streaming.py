@@ -0,0 +1,85 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+import csv
+
+# rows fetched from the database and serialized at a time while streaming.
+STREAM_CHUNK_SIZE = 2000
+
+encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+# lets content negotiation accept `Accept: application/x-ndjson` (or `?format=ndjson`), listings are streamed
+# line by line then. anything else answered this way (errors) is a single line.
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (encoder.encode(data) + '\n').encode(self.charset)
+
+
+# lets content negotiation accept `Accept: text/csv` (or `?format=csv`) for exports streamed as CSV. anything
+# else answered this way (errors) is JSON, there are no columns to put it in.
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return encoder.encode(data).encode(self.charset)
+
+
+def serialized_rows(queryset, serialize, chunk_size):
+    batch = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield from serialize(batch)
+            batch = []
+    if batch:
+        yield from serialize(batch)
+
+
+# one JSON object per line, written as rows come out of the database.
+def ndjson_stream(queryset, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    for row in serialized_rows(queryset, serialize, chunk_size):
+        yield encoder.encode(row) + '\n'
+
+
+# same body as the non streamed listing, {"success": [...]}, written a chunk of rows at a time.
+def json_stream(queryset, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    return json_items_stream(serialized_rows(queryset, serialize, chunk_size), chunk_size)
+
+
+# {"success": [...]} holding every item, written a chunk of items at a time.
+def json_items_stream(items, chunk_size=STREAM_CHUNK_SIZE):
+    yield '{"success":['
+    separator = ''
+    lines = []
+    for item in items:
+        lines.append(separator + encoder.encode(item))
+        separator = ','
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    lines.append(']}')
+    yield ''.join(lines)
+
+
+# csv.writer() returns what it writes to this, lines are handed out instead of being buffered.
+class Echo:
+    def write(self, value):
+        return value
+
+
+# the header and every row as CSV, written a chunk of rows at a time.
+def csv_stream(header, rows, chunk_size=STREAM_CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    lines = [writer.writerow(header)]
+    for row in rows:
+        lines.append(writer.writerow(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
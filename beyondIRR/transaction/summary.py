@@ -0,0 +1,184 @@
+from django.db.models import Case, When, Value, Sum, Count, F
+from django.db.models.functions import ExtractYear, ExtractMonth
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from decimal import Decimal
+import zoneinfo
+from .models import Transaction, FinancialYearSummary, ASSET_CHOICES, ASSET_LABELS
+
+# the Indian financial year runs from 1 April to 31 March, in Indian time whatever timezone is active.
+FINANCIAL_YEAR_TZ = zoneinfo.ZoneInfo('Asia/Kolkata')
+FINANCIAL_YEAR_START_MONTH = 4
+
+# columns of a transaction the summary depends on.
+SUMMARY_FIELDS = ('date_of_transaction', 'asset_class', 'amount')
+
+# uploads store the choice key, older rows the label, both are totalled under the key.
+ASSET_CLASS_KEYS = {label: key for key, label in ASSET_CHOICES}
+
+AMOUNT_FIELD = Transaction._meta.get_field('amount')
+AMOUNT_PLACES = Decimal(1).scaleb(-AMOUNT_FIELD.decimal_places)
+
+
+# calendar year the financial year of `field` starts in, computed by the database.
+def fiscal_year(field='date_of_transaction'):
+    return ExtractYear(field, tzinfo=FINANCIAL_YEAR_TZ) - Case(
+        When(LessThan(ExtractMonth(field, tzinfo=FINANCIAL_YEAR_TZ), FINANCIAL_YEAR_START_MONTH), then=Value(1)),
+        default=Value(0),
+    )
+
+
+# same as fiscal_year() for a single datetime, naive ones are in project time like the ORM stores them.
+def fiscal_year_of(date):
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    date = date.astimezone(FINANCIAL_YEAR_TZ)
+    return date.year - (1 if date.month < FINANCIAL_YEAR_START_MONTH else 0)
+
+
+def financial_year_label(year):
+    return f"FY{str(year)[-2:]}-{str(year + 1)[-2:]}"
+
+
+def asset_class_key(asset_class):
+    return ASSET_CLASS_KEYS.get(asset_class, asset_class)
+
+
+# deltas map (fiscal_year, asset_class) -> (amount, transactions) to add to the summary.
+def add_delta(deltas, date, asset_class, amount, count):
+    key = (fiscal_year_of(date), asset_class_key(asset_class))
+    total, transactions = deltas.get(key, (Decimal(0), 0))
+    deltas[key] = (total + amount, transactions + count)
+
+
+# adds the deltas to the user's summary rows, a few queries whatever the number of transactions behind them.
+# rows left without transactions are removed.
+def apply_summary_deltas(user_id, deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not deltas:
+        return
+    FinancialYearSummary.objects.bulk_create(
+        [FinancialYearSummary(user_id=user_id, fiscal_year=year, asset_class=asset_class) for year, asset_class in deltas],
+        ignore_conflicts=True,
+    )
+    for (year, asset_class), (amount, count) in deltas.items():
+        FinancialYearSummary.objects.filter(user_id=user_id, fiscal_year=year, asset_class=asset_class).update(
+            amount=F('amount') + amount,
+            transactions=F('transactions') + count,
+        )
+    if any(count < 0 for _, count in deltas.values()):
+        FinancialYearSummary.objects.filter(user_id=user_id, transactions__lte=0).delete()
+
+
+# user_id -> deltas holding the totals of the given transactions, from one GROUP BY query.
+def grouped_totals(queryset):
+    rows = (
+        queryset.annotate(fiscal_year=fiscal_year())
+        .values_list('user_id', 'fiscal_year', 'asset_class')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+        .order_by()
+    )
+    totals = defaultdict(dict)
+    for user_id, year, asset_class, total, count in rows:
+        # some backends (SQLite) sum decimals as floats, rounded back to what the columns hold.
+        total = total.quantize(AMOUNT_PLACES)
+        key = (year, asset_class_key(asset_class))
+        current_total, current_count = totals[user_id].get(key, (Decimal(0), 0))
+        totals[user_id][key] = (current_total + total, current_count + count)
+    return totals
+
+
+# takes the transactions out of the summary, returns the users they belong to.
+def remove_from_summary(queryset):
+    totals = grouped_totals(queryset)
+    for user_id, deltas in totals.items():
+        apply_summary_deltas(user_id, {key: (-total, -count) for key, (total, count) in deltas.items()})
+    return list(totals)
+
+
+# takes the row out of the summary as it was before the save (when it existed) and adds it as saved.
+# fields left out of update_fields still hold their earlier value in the database.
+def record_saved_transaction(transaction, before, update_fields=None):
+    after = [getattr(transaction, field) for field in SUMMARY_FIELDS]
+    if before and update_fields is not None:
+        after = [value if field in update_fields else old for field, value, old in zip(SUMMARY_FIELDS, after, before)]
+    date, asset_class, amount = after
+    deltas = {}
+    if before:
+        add_delta(deltas, before[0], before[1], -before[2], -1)
+    add_delta(deltas, date, asset_class, AMOUNT_FIELD.to_python(amount).quantize(AMOUNT_PLACES), 1)
+    apply_summary_deltas(transaction.user_id, deltas)
+
+
+# {"FY24-25": {"Equity": ..., "Debt": ..., "Alternate": ...}, ...} newest year first, read from the summary table.
+def user_summary(user):
+    rows = (
+        FinancialYearSummary.objects.filter(user_id=user.pk, transactions__gt=0)
+        .order_by('-fiscal_year')
+        .values_list('fiscal_year', 'asset_class', 'amount')
+    )
+    summary = {}
+    for year, asset_class, amount in rows:
+        totals = summary.setdefault(financial_year_label(year), {label: 0 for label in ASSET_LABELS.values()})
+        if asset_class in ASSET_LABELS:
+            totals[ASSET_LABELS[asset_class]] = amount
+    return summary
+
+
+# (arn_number, financial year label, {"Equity": ..., "Debt": ..., "Alternate": ...}) of every user, or of the
+# given ARN numbers, by ARN then newest year first. one query over the summary table, which is keyed by the ARN
+# number (the user's primary key) and read in order of its unique index, rows are fetched in chunks as consumed.
+def all_user_summaries(arn_numbers=None, chunk_size=2000):
+    rows = FinancialYearSummary.objects.filter(transactions__gt=0)
+    if arn_numbers is not None:
+        rows = rows.filter(user_id__in=arn_numbers)
+    rows = rows.order_by('user_id', '-fiscal_year').values_list('user_id', 'fiscal_year', 'asset_class', 'amount')
+    for (arn_number, year), year_rows in groupby(rows.iterator(chunk_size=chunk_size), key=itemgetter(0, 1)):
+        totals = {label: 0 for label in ASSET_LABELS.values()}
+        for _, _, asset_class, amount in year_rows:
+            if asset_class in ASSET_LABELS:
+                totals[ASSET_LABELS[asset_class]] = amount
+        yield arn_number, financial_year_label(year), totals
+
+
+# user_id -> deltas currently stored in the summary table.
+def stored_totals(users=None):
+    rows = FinancialYearSummary.objects.filter(transactions__gt=0)
+    if users is not None:
+        rows = rows.filter(user__in=users)
+    totals = defaultdict(dict)
+    for user_id, year, asset_class, amount, count in rows.values_list('user_id', 'fiscal_year', 'asset_class', 'amount', 'transactions'):
+        totals[user_id][(year, asset_class)] = (amount, count)
+    return totals
+
+
+# (user_id, fiscal_year, asset_class, expected, stored) of every summary row that does not match the transactions.
+def summary_mismatches(users=None):
+    transactions = Transaction.objects.all() if users is None else Transaction.objects.filter(user__in=users)
+    expected = grouped_totals(transactions)
+    stored = stored_totals(users)
+    mismatches = []
+    for user_id in sorted(set(expected) | set(stored)):
+        for key in sorted(set(expected.get(user_id, {})) | set(stored.get(user_id, {}))):
+            want = expected.get(user_id, {}).get(key)
+            have = stored.get(user_id, {}).get(key)
+            if want != have:
+                mismatches.append((user_id, *key, want, have))
+    return mismatches
+
+
+# recomputes the summary of the given users (everyone when None) from their transactions.
+def rebuild_summaries(users=None):
+    transactions = Transaction.objects.all() if users is None else Transaction.objects.filter(user__in=users)
+    rows = FinancialYearSummary.objects.all() if users is None else FinancialYearSummary.objects.filter(user__in=users)
+    rows.delete()
+    summaries = [
+        FinancialYearSummary(user_id=user_id, fiscal_year=year, asset_class=asset_class, amount=total, transactions=count)
+        for user_id, deltas in grouped_totals(transactions).items()
+        for (year, asset_class), (total, count) in deltas.items()
+    ]
+    FinancialYearSummary.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
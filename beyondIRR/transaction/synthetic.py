@@ -0,0 +1,60 @@
+from io import BytesIO
+import gzip
+import numpy as np
+import pandas as pd
+from .models import UPLOAD_HEADERS
+
+ASSET_LABELS = ['Equity', 'Debt', 'Alternate']
+STATEMENT_FORMATS = ['xlsx', 'csv', 'tsv', 'csv.gz', 'jsonl']
+
+
+# statement of `rows` transactions spread over a realistic number of products, every (product, date) pair
+# is unique so the whole file can be written without collisions.
+def synthetic_statement(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    products = max(1, rows // 50)
+    index = np.arange(rows)
+    product_ids = index % products
+    dates = pd.Timestamp('2015-04-01') + pd.to_timedelta(index // products, unit='D')
+    return pd.DataFrame({
+        'Product': [f'PRODUCT_{product_id:05d}' for product_id in product_ids],
+        'Asset Class': np.array(ASSET_LABELS)[product_ids % len(ASSET_LABELS)],
+        'Date': dates,
+        'Amount': rng.uniform(-10000, 10000, rows).round(2),
+        'Units': rng.uniform(-100, 100, rows).round(2),
+    }, columns=UPLOAD_HEADERS)
+
+
+# statement with blank cells in `missing` rows, for tests of the validation report.
+def statement_with_missing_values(rows, missing, seed=0):
+    df = synthetic_statement(rows, seed).astype(object)
+    rng = np.random.default_rng(seed)
+    for row in rng.choice(rows, size=min(missing, rows), replace=False):
+        df.iat[row, rng.integers(len(UPLOAD_HEADERS))] = None
+    return df
+
+
+# bytes of the statement written in one of STATEMENT_FORMATS.
+def statement_bytes(df, file_format):
+    file = BytesIO()
+    if file_format == 'xlsx':
+        df.to_excel(file, index=False)
+    elif file_format == 'csv':
+        df.to_csv(file, index=False)
+    elif file_format == 'tsv':
+        df.to_csv(file, sep='\t', index=False)
+    elif file_format == 'csv.gz':
+        with gzip.GzipFile(fileobj=file, mode='wb') as gz:
+            df.to_csv(gz, index=False)
+    elif file_format == 'jsonl':
+        df.to_json(file, orient='records', lines=True, date_format='iso')
+    else:
+        raise ValueError(f'Unknown statement format {file_format}')
+    return file.getvalue()
+
+
+# named file object, like the ones test clients and the request factory send as multipart uploads.
+def statement_file(df, file_format, name='statement'):
+    file = BytesIO(statement_bytes(df, file_format))
+    file.name = f'{name}.{file_format}'
+    return file
@@ -1,20 +1,49 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework.test import APITestCase
-from .models import User, Transaction
+from rest_framework.renderers import JSONRenderer
+from .models import User, Transaction, TransactionSerializer, UploadJob, UploadFingerprint, ChunkedUpload, FinancialYearSummary, UPLOAD_HEADERS
+from .summary import summary_mismatches
+from .versions import data_version
+from .xirr import xirr, scalar_xirr
+from .serializers import ValuesSerializer
+from .jobs import run_next_job, claim_next_job, reclaim_stale_jobs, heartbeat_key
+from .chunked import append_chunk, OffsetMismatchError
+from .validation import UploadValidator
+from .upsert import upsert_transactions
+from .readers import read_excel_chunks, detect_format, MissingHeadersError
+from .sheets import parse_sheet
+from .synthetic import synthetic_statement, statement_bytes, statement_file, statement_with_missing_values, STATEMENT_FORMATS
 from django.urls import reverse
 from rest_framework import status
 import random
+import json
+import os
+import tempfile
+import tracemalloc
+import shutil
+import zoneinfo
 import datetime
 from django.utils import timezone
-from beyondIRR.settings import BASE_DIR
+from django.db import IntegrityError, connection, transaction as db_transaction
+from django.test.utils import CaptureQueriesContext
+from io import BytesIO, StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+import pandas as pd
+import numpy as np
 from rest_framework_simplejwt.tokens import RefreshToken
+from assets.authentication import add_user_claims
 
 class AddTransactionViewTests(APITestCase):
     def setUp(self):
         self.url = reverse('upload-transaction')
-        self.valid_file_path = str(BASE_DIR) + '/template.xlsx'
-        self.invalid_file_path = str(BASE_DIR) + '/public_key.pem'
-        self.missing_values_file_path = str(BASE_DIR) + '/missing_values.xlsx'
+        # statements are generated, nothing has to be placed next to manage.py.
+        self.valid_file = statement_file(synthetic_statement(200), 'xlsx', 'template')
+        self.invalid_file = BytesIO(b'-----BEGIN PUBLIC KEY-----\nnot a statement\n-----END PUBLIC KEY-----\n')
+        self.invalid_file.name = 'public_key.pem'
+        self.missing_values_file = statement_file(statement_with_missing_values(200, 5), 'xlsx', 'missing_values')
 
         self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
         self.user_token = self.get_jwt_token(self.user) 
@@ -25,32 +54,658 @@ class AddTransactionViewTests(APITestCase):
     
     def test_add_transaction_success(self):
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
-        with open(self.valid_file_path, 'rb') as file:
-            response = self.client.post(self.url, {'file': file}, format='multipart')
+        response = self.client.post(self.url, {'file': self.valid_file}, format='multipart')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('user', response.data)
 
     def test_add_transaction_invalid_file(self):
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
-        with open(self.invalid_file_path, 'rb') as file:
-            response = self.client.post(self.url, {'file': file}, format='multipart')
+        response = self.client.post(self.url, {'file': self.invalid_file}, format='multipart')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('error', response.data)
         
     def test_add_transaction_missing_values_file(self):
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
-        with open(self.missing_values_file_path, 'rb') as file:
-            response = self.client.post(self.url, {'file': file}, format='multipart')
+        response = self.client.post(self.url, {'file': self.missing_values_file}, format='multipart')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('error', response.data)
 
 
     def test_unauthorized_access(self):
-        with open(self.valid_file_path, 'rb') as file:
-            response = self.client.post(self.url, {'file': file}, format='multipart')
+        response = self.client.post(self.url, {'file': self.valid_file}, format='multipart')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class BulkUpsertTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('upload-transaction')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def statement(self, rows):
+        file = BytesIO()
+        pd.DataFrame(rows, columns=['Product', 'Asset Class', 'Date', 'Amount', 'Units']).to_excel(file, index=False)
+        file.name = 'statement.xlsx'
+        file.seek(0)
+        return file
+
+    def upload(self, rows):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        return self.client.post(self.url, {'file': self.statement(rows)}, format='multipart')
+
+    def test_insert_then_update(self):
+        rows = [
+            ['PRODUCT_001', 'Equity', datetime.datetime(2024, 1, 23), 1000, 10],
+            ['PRODUCT_002', 'Debt', datetime.datetime(2024, 1, 23), 500, 5],
+        ]
+        response = self.upload(rows)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['inserted'], 2)
+        self.assertEqual(response.data['updated'], 0)
+
+        rows[0][3] = 2000
+        rows.append(['PRODUCT_003', 'Alternate', datetime.datetime(2024, 2, 1), 100, 1])
+        response = self.upload(rows)
+        self.assertEqual(response.data['inserted'], 1)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['unchanged'], 1)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(Transaction.objects.get(user=self.user, product='PRODUCT_001').amount, 2000)
+
+    def test_unchanged_upload_writes_nothing(self):
+        rows = [
+            ['PRODUCT_001', 'Equity', datetime.datetime(2024, 1, 23), 1000.12345, 10],
+            ['PRODUCT_002', 'Debt', datetime.datetime(2024, 1, 23), 500, 5],
+        ]
+        self.upload(rows)
+        # forget the file so it is processed again instead of replayed.
+        UploadFingerprint.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(rows)
+        self.assertEqual(response.data['unchanged'], 2)
+        self.assertEqual(response.data['inserted'] + response.data['updated'], 0)
+        self.assertFalse([query for query in queries if query['sql'].startswith(('INSERT INTO "transaction_transaction"', 'UPDATE "transaction_transaction"'))])
+
+    def test_repeated_row_in_file_keeps_last(self):
+        rows = [
+            ['PRODUCT_001', 'Equity', datetime.datetime(2024, 1, 23), 1000, 10],
+            ['PRODUCT_001', 'Equity', datetime.datetime(2024, 1, 23), 3000, 30],
+        ]
+        response = self.upload(rows)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['inserted'], 1)
+        self.assertEqual(Transaction.objects.get(user=self.user, product='PRODUCT_001').amount, 3000)
+
+    def test_repeat_in_later_chunk_compares_with_stored_row(self):
+        upsert_transactions(self.user, UploadValidator().clean_chunks([synthetic_statement(3)]))
+        stored = synthetic_statement(3).iloc[[0]]
+        changed = stored.assign(Amount=stored['Amount'] + 1)
+        result = upsert_transactions(self.user, UploadValidator().clean_chunks([changed, stored]))
+        self.assertEqual(result, {"inserted": 0, "updated": 0, "unchanged": 1, "duplicates": 1})
+        self.assertEqual(summary_mismatches([self.user.pk]), [])
+
+    def test_memory_per_row(self):
+        rows = 10000
+        chunks = [synthetic_statement(rows).iloc[start:start + 5000] for start in range(0, rows, 5000)]
+        upsert_transactions(self.user, UploadValidator().clean_chunks(chunks))
+        changed = [chunk.assign(Amount=chunk['Amount'] + 1) for chunk in chunks]
+        tracemalloc.start()
+        try:
+            result = upsert_transactions(self.user, UploadValidator().clean_chunks(changed))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(result["updated"], rows)
+        # the key map and one chunk in flight, keeping the stored rows themselves took over 1 kB each.
+        self.assertLess(peak, rows * 500 + 4 * 2 ** 20)
+
+    def test_invalid_row_rolls_back_upload(self):
+        rows = [
+            ['PRODUCT_001', 'Equity', datetime.datetime(2024, 1, 23), 1000, 10],
+            ['PRODUCT_002', 'Debt', None, 500, 5],
+        ]
+        response = self.upload(rows)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 0)
+
+
+class UploadValidationTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('upload-transaction')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def upload(self, content):
+        file = BytesIO(content)
+        file.name = 'statement.csv'
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        return self.client.post(self.url, {'file': file}, format='multipart')
+
+    def test_asset_labels_are_stored_as_keys(self):
+        response = self.upload(
+            b'Product,Asset Class,Date,Amount,Units\n'
+            b'PRODUCT_1,equity,2024-01-23,100,1\n'
+            b'PRODUCT_2,DEBT,2024-01-23,200,2\n'
+            b'PRODUCT_3, Alternate ,2024-01-23,300,3\n'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stored = dict(Transaction.objects.values_list('product', 'asset_class'))
+        self.assertEqual(stored, {'PRODUCT_1': 'EQUITY', 'PRODUCT_2': 'DEBT', 'PRODUCT_3': 'ALTERNATE'})
+
+    def test_duplicate_rows_are_dropped(self):
+        response = self.upload(
+            b'Product,Asset Class,Date,Amount,Units\n'
+            b'PRODUCT_1,Equity,2024-01-23,100,1\n'
+            b'PRODUCT_1,Equity,2024-01-23,150,1\n'
+        )
+        self.assertEqual(response.data['duplicates'], 1)
+        self.assertEqual(Transaction.objects.get(product='PRODUCT_1').amount, 150)
+
+    def test_duplicates_across_chunks(self):
+        rows = [['PRODUCT_1', 'Equity', '2024-01-23', 100, 1], ['PRODUCT_2', 'Equity', '2024-01-23', 100, 1],
+                ['PRODUCT_1', 'Equity', '2024-01-23', 150, 1], ['PRODUCT_1', 'Equity', '2024-01-23', 175, 1]]
+        df = pd.DataFrame(rows, columns=['Product', 'Asset Class', 'Date', 'Amount', 'Units'])
+        results = []
+        for chunk_size in (len(rows), 1):
+            Transaction.objects.all().delete()
+            validator = UploadValidator()
+            chunks = [df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size)]
+            result = upsert_transactions(self.user, validator.clean_chunks(chunks))
+            results.append((validator.duplicates + result.pop('duplicates'), result))
+            self.assertEqual(Transaction.objects.get(product='PRODUCT_1').amount, 175)
+            self.assertEqual(summary_mismatches([self.user.pk]), [])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], (2, {"inserted": 2, "updated": 0, "unchanged": 0}))
+
+    def test_bad_rows_are_reported_and_nothing_is_written(self):
+        response = self.upload(
+            b'Product,Asset Class,Date,Amount,Units\n'
+            b'PRODUCT_1,Equity,2024-01-23,100,1\n'
+            b'PRODUCT_2,Gold,2024-01-23,100,1\n'
+            b'PRODUCT_3,Debt,not a date,abc,1\n'
+            b',Debt,2024-01-23,100,1\n'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error_count'], 4)
+        errors = {(error['row'], error['column']) for error in response.data['errors']}
+        self.assertEqual(errors, {(3, 'Asset Class'), (4, 'Date'), (4, 'Amount'), (5, 'Product')})
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_jsonl_nulls_are_missing(self):
+        file = BytesIO(
+            b'{"Product": null, "Asset Class": "Equity", "Date": "2024-01-23", "Amount": 100, "Units": 1}\n'
+            b'{"Product": "PRODUCT_2", "Asset Class": "Equity", "Date": null, "Amount": 100.5, "Units": 1}\n'
+        )
+        file.name = 'statement.jsonl'
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = {(error['row'], error['column']) for error in response.data['errors']}
+        self.assertEqual(errors, {(2, 'Product'), (3, 'Date')})
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_validator_normalizes_columns(self):
+        validator = UploadValidator()
+        df = pd.DataFrame([['PRODUCT_1', 'Equity', '2024-01-23', '100.5', 2]], columns=['Product', 'Asset Class', 'Date', 'Amount', 'Units'])
+        clean = validator.validate(df)
+        self.assertEqual(clean.iloc[0]['Asset Class'], 'EQUITY')
+        self.assertEqual(clean.iloc[0]['Amount'], 100.5)
+        self.assertIsNotNone(clean.iloc[0]['Date'].tzinfo)
+
+    def test_mixed_date_formats(self):
+        response = self.upload(
+            b'Product,Asset Class,Date,Amount,Units\n'
+            b'PRODUCT_1,Equity,2024-01-24T10:30:00Z,100,1\n'
+            b'PRODUCT_2,Equity,2024-01-24 10:30:00,100,1\n'
+            b'PRODUCT_3,Equity,2024-01-24T10:30:00+05:30,100,1\n'
+            b'PRODUCT_4,Equity,2024-01-24T10:30:00-04:00,100,1\n'
+            b'PRODUCT_5,Equity,2024-01-24,100,1\n'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        kolkata = zoneinfo.ZoneInfo('Asia/Kolkata')
+        stored = dict(Transaction.objects.values_list('product', 'date_of_transaction'))
+        self.assertEqual(stored, {
+            'PRODUCT_1': datetime.datetime(2024, 1, 24, 10, 30, tzinfo=datetime.timezone.utc),
+            # without an offset dates are in project timezone.
+            'PRODUCT_2': datetime.datetime(2024, 1, 24, 10, 30, tzinfo=kolkata),
+            'PRODUCT_3': datetime.datetime(2024, 1, 24, 10, 30, tzinfo=kolkata),
+            'PRODUCT_4': datetime.datetime(2024, 1, 24, 14, 30, tzinfo=datetime.timezone.utc),
+            'PRODUCT_5': datetime.datetime(2024, 1, 24, tzinfo=kolkata),
+        })
+
+    def test_dates_do_not_depend_on_chunks(self):
+        rows = [['PRODUCT_1', 'Equity', '2024-01-24T10:30:00Z', 100, 1], ['PRODUCT_2', 'Equity', '2024-01-24 10:30:00', 100, 1],
+                ['PRODUCT_3', 'Equity', '2024-01-24T10:30:00+05:30', 100, 1], ['PRODUCT_4', 'Equity', '25/01/2024', 100, 1]]
+        df = pd.DataFrame(rows, columns=['Product', 'Asset Class', 'Date', 'Amount', 'Units'])
+        whole = UploadValidator().validate(df)['Date'].tolist()
+        validator = UploadValidator()
+        chunked = [date for start in range(len(df)) for date in validator.validate(df.iloc[start:start + 1])['Date']]
+        self.assertEqual(whole, chunked)
+        self.assertEqual(validator.error_count, 0)
+
+
+class UploadFingerprintTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('upload-transaction')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+        self.first = statement_bytes(synthetic_statement(50), 'csv')
+        self.second = statement_bytes(synthetic_statement(50, seed=1), 'csv')
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def upload(self, content):
+        file = BytesIO(content)
+        file.name = 'statement.csv'
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        return self.client.post(self.url, {'file': file}, format='multipart')
+
+    def test_identical_upload_returns_earlier_result(self):
+        first = self.upload(self.first)
+        self.assertFalse(first.data['replayed'])
+        with CaptureQueriesContext(connection) as queries:
+            again = self.upload(self.first)
+        self.assertTrue(again.data['replayed'])
+        self.assertEqual(again.data['inserted'], first.data['inserted'])
+        self.assertFalse([query for query in queries if 'transaction_transaction' in query['sql']])
+
+    def test_changed_data_invalidates_older_fingerprints(self):
+        self.upload(self.first)
+        self.upload(self.second)
+        again = self.upload(self.first)
+        self.assertFalse(again.data['replayed'])
+        self.assertEqual(again.data['updated'], 50)
+
+    def test_edits_invalidate_fingerprints(self):
+        self.upload(self.first)
+        Transaction.objects.filter(user=self.user).first().delete()
+        again = self.upload(self.first)
+        self.assertFalse(again.data['replayed'])
+        self.assertEqual((again.data['inserted'], again.data['unchanged']), (1, 49))
+
+        transaction = Transaction.objects.filter(user=self.user).first()
+        transaction.amount = 1
+        transaction.save()
+        again = self.upload(self.first)
+        self.assertFalse(again.data['replayed'])
+        self.assertEqual(again.data['updated'], 1)
+        # nothing changed since, the last result is replayed.
+        self.assertTrue(self.upload(self.first).data['replayed'])
+
+    def test_expired_fingerprint_is_reprocessed(self):
+        self.upload(self.first)
+        UploadFingerprint.objects.update(created_at=timezone.now() - datetime.timedelta(days=2))
+        again = self.upload(self.first)
+        self.assertFalse(again.data['replayed'])
+        self.assertEqual(again.data['unchanged'], 50)
+
+
+class ExcelReaderTests(TestCase):
+    def statement(self, rows, columns=('Product', 'Asset Class', 'Date', 'Amount', 'Units')):
+        file = BytesIO()
+        pd.DataFrame(rows, columns=list(columns)).to_excel(file, index=False)
+        file.seek(0)
+        return file
+
+    def test_rows_are_read_in_chunks(self):
+        rows = [[f'PRODUCT_{i}', 'Equity', datetime.datetime(2024, 1, i + 1), 100, 1] for i in range(5)]
+        chunks = list(read_excel_chunks(self.statement(rows), chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(list(chunks[0].columns), ['Product', 'Asset Class', 'Date', 'Amount', 'Units'])
+        self.assertEqual(chunks[2].iloc[0]['Product'], 'PRODUCT_4')
+
+    def test_header_order_does_not_matter(self):
+        rows = [[1, 100, datetime.datetime(2024, 1, 1), 'Debt', 'PRODUCT_1']]
+        file = self.statement(rows, columns=('Units', 'Amount', 'Date', 'Asset Class', 'Product'))
+        chunk = next(read_excel_chunks(file))
+        self.assertEqual(list(chunk.iloc[0]), ['PRODUCT_1', 'Debt', datetime.datetime(2024, 1, 1), 100, 1])
+
+    def test_missing_header(self):
+        file = self.statement([['PRODUCT_1', 'Equity', 100]], columns=('Product', 'Asset Class', 'Amount'))
+        with self.assertRaises(MissingHeadersError):
+            read_excel_chunks(file)
+
+
+class MultiFormatUploadTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('upload-transaction')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+        self.df = synthetic_statement(120)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def upload(self, file_format):
+        file = BytesIO(statement_bytes(self.df, file_format))
+        file.name = 'statement.' + file_format
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        return self.client.post(self.url, {'file': file}, format='multipart')
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format(BytesIO(statement_bytes(self.df, 'xlsx'))), 'xlsx')
+        self.assertEqual(detect_format(BytesIO(statement_bytes(self.df, 'csv.gz'))), 'gzip')
+        self.assertEqual(detect_format(BytesIO(statement_bytes(self.df, 'csv'))), 'csv')
+        self.assertEqual(detect_format(BytesIO(statement_bytes(self.df, 'tsv'))), 'tsv')
+        self.assertEqual(detect_format(BytesIO(statement_bytes(self.df, 'jsonl'))), 'jsonl')
+        self.assertEqual(detect_format(BytesIO(b'a;b\n'), 'text/tab-separated-values'), 'tsv')
+
+    def test_every_format_uploads_same_rows(self):
+        for file_format in STATEMENT_FORMATS:
+            Transaction.objects.all().delete()
+            response = self.upload(file_format)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, file_format)
+            self.assertEqual(response.data['inserted'], 120, file_format)
+            self.assertEqual(Transaction.objects.filter(user=self.user).count(), 120, file_format)
+
+    def test_csv_missing_header(self):
+        file = BytesIO(b'Product,Amount\nPRODUCT_1,100\n')
+        file.name = 'statement.csv'
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('necessary headers', response.data)
+
+
+# the upload spool and the jobs cache of the test class live in a temporary directory removed after it.
+class TemporaryUploadDirs:
+    @classmethod
+    def setUpClass(cls):
+        cls.upload_root = tempfile.mkdtemp()
+        jobs = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(cls.upload_root, 'progress')}
+        cls.upload_settings = override_settings(
+            UPLOAD_JOB_DIR=os.path.join(cls.upload_root, 'jobs'),
+            CHUNKED_UPLOAD_DIR=os.path.join(cls.upload_root, 'chunked'),
+            CACHES={**settings.CACHES, 'jobs': jobs},
+        )
+        cls.upload_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.upload_settings.disable()
+            shutil.rmtree(cls.upload_root, ignore_errors=True)
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.upload_settings.disable()
+            shutil.rmtree(cls.upload_root, ignore_errors=True)
+
+
+class BackgroundUploadTests(TemporaryUploadDirs, APITestCase):
+    def setUp(self):
+        self.url = reverse('upload-transaction')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.other = User.objects.create(email="other@example.com", password="Test@123", arn_number=12345, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def upload(self, content, name='statement.csv'):
+        file = BytesIO(content)
+        file.name = name
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        return self.client.post(self.url + '?async=1', {'file': file}, format='multipart')
+
+    def test_upload_is_queued_then_processed(self):
+        response = self.upload(statement_bytes(synthetic_statement(300), 'csv'))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+        status_url = response.data['status_url']
+        self.assertEqual(self.client.get(status_url).data['success']['state'], 'QUEUED')
+
+        job = run_next_job()
+        self.assertEqual(job.state, 'DONE')
+        self.assertFalse(os.path.exists(job.file_path))
+        self.assertIsNone(run_next_job())
+
+        job_status = self.client.get(status_url).data['success']
+        self.assertEqual(job_status['state'], 'DONE')
+        self.assertEqual(job_status['rows_processed'], 300)
+        self.assertEqual(job_status['inserted'], 300)
+        self.assertIsNotNone(job_status['throughput'])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 300)
+
+    def test_failed_job_reports_errors(self):
+        response = self.upload(b'Product,Amount\nPRODUCT_1,100\n')
+        job = run_next_job()
+        self.assertEqual(job.state, 'FAILED')
+        job_status = self.client.get(response.data['status_url']).data['success']
+        self.assertIn('necessary headers', job_status['errors'])
+
+    def test_stale_running_job_is_reclaimed(self):
+        self.upload(statement_bytes(synthetic_statement(50), 'csv'))
+        job = claim_next_job()
+        self.assertEqual((job.state, job.attempts), ('RUNNING', 1))
+        # the worker keeps sending heartbeats, the job is left alone.
+        long_ago = timezone.now() - settings.UPLOAD_JOB_STALE_AFTER - datetime.timedelta(minutes=1)
+        UploadJob.objects.filter(id=job.id).update(started_at=long_ago)
+        self.assertEqual(reclaim_stale_jobs(), [])
+
+        # the worker died, the job runs again.
+        caches['jobs'].set(heartbeat_key(job.id), long_ago)
+        job = run_next_job()
+        self.assertEqual((job.state, job.attempts, job.inserted), ('DONE', 2, 50))
+        self.assertFalse(os.path.exists(job.file_path))
+
+    @override_settings(UPLOAD_JOB_MAX_ATTEMPTS=1)
+    def test_stale_job_fails_after_max_attempts(self):
+        response = self.upload(statement_bytes(synthetic_statement(50), 'csv'))
+        job = claim_next_job()
+        long_ago = timezone.now() - settings.UPLOAD_JOB_STALE_AFTER - datetime.timedelta(minutes=1)
+        UploadJob.objects.filter(id=job.id).update(started_at=long_ago)
+        caches['jobs'].delete(heartbeat_key(job.id))
+        self.assertIsNone(run_next_job())
+        job_status = self.client.get(response.data['status_url']).data['success']
+        self.assertEqual(job_status['state'], 'FAILED')
+        self.assertIn('error', job_status['errors'])
+        self.assertFalse(os.path.exists(job.file_path))
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_job_of_other_user(self):
+        job = UploadJob.objects.create(user=self.other, file_path='/tmp/none.csv')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        response = self.client.get(reverse('upload-job', args=[job.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ChunkedUploadTests(TemporaryUploadDirs, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+        self.content = statement_bytes(synthetic_statement(400), 'xlsx')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def start(self, size=None):
+        data = {'filename': 'statement.xlsx'}
+        if size is not None:
+            data['size'] = size
+        response = self.client.post(reverse('chunked-upload'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data
+
+    def send(self, upload, offset, data):
+        return self.client.put(upload['upload_url'], data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_upload_in_chunks(self):
+        upload = self.start(len(self.content))
+        offset = 0
+        for start in range(0, len(self.content), 4096):
+            response = self.send(upload, offset, self.content[start:start + 4096])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            offset = response.data['offset']
+        self.assertEqual(offset, len(self.content))
+
+        response = self.client.post(reverse('chunked-upload-finalize', args=[upload['upload']]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['inserted'], 400)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 400)
+        self.assertFalse(os.path.exists(ChunkedUpload.objects.get(id=upload['upload']).file_path))
+
+        # finalizing twice does not process the file again.
+        response = self.client.post(reverse('chunked-upload-finalize', args=[upload['upload']]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_resume_from_acknowledged_offset(self):
+        upload = self.start(len(self.content))
+        half = len(self.content) // 2
+        self.assertEqual(self.send(upload, 0, self.content[:half]).data['offset'], half)
+
+        # a retried or out of order chunk is refused with the offset to resume from.
+        response = self.send(upload, 0, self.content[:half])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], half)
+        self.assertEqual(self.client.get(upload['upload_url']).data['success']['offset'], half)
+
+        # finalize before every byte arrived leaves the upload open.
+        response = self.client.post(reverse('chunked-upload-finalize', args=[upload['upload']]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(self.send(upload, half, self.content[half:]).data['offset'], len(self.content))
+        response = self.client.post(reverse('chunked-upload-finalize', args=[upload['upload']]))
+        self.assertEqual(response.data['inserted'], 400)
+
+    def test_chunk_past_declared_size(self):
+        upload = self.start(10)
+        response = self.send(upload, 0, b'x' * 11)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self.client.get(upload['upload_url']).data['success']['offset'], 0)
+
+    def test_stale_chunk_leaves_acknowledged_bytes(self):
+        upload = self.start(len(self.content))
+        half = len(self.content) // 2
+        stale = ChunkedUpload.objects.get(id=upload['upload'])
+        self.assertEqual(self.send(upload, 0, self.content[:half]).data['offset'], half)
+        # a duplicate request which read the upload before the first chunk was acknowledged.
+        with self.assertRaises(OffsetMismatchError):
+            append_chunk(stale, 0, BytesIO(b'x' * 100))
+        with open(stale.file_path, 'rb') as file:
+            self.assertEqual(file.read(), self.content[:half])
+        self.assertEqual(os.listdir(os.path.dirname(stale.file_path)), ['data'])
+
+    def test_filename_is_not_a_path(self):
+        for filename in ('..', '.', 'x' * 300, '../../statement.xlsx', ''):
+            response = self.client.post(reverse('chunked-upload'), {'filename': filename}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, filename)
+            upload = ChunkedUpload.objects.get(id=response.data['upload'])
+            self.assertEqual(upload.file_path, os.path.join(settings.CHUNKED_UPLOAD_DIR, str(upload.id), 'data'))
+            self.assertLessEqual(len(upload.filename), 255)
+            self.assertEqual(self.send(response.data, 0, self.content).status_code, status.HTTP_200_OK)
+
+    @override_settings(CHUNKED_UPLOAD_MAX_SIZE=10)
+    def test_size_limit_without_declared_size(self):
+        upload = self.start()
+        self.assertEqual(self.send(upload, 0, b'x' * 6).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.send(upload, 6, b'x' * 5).status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self.client.get(upload['upload_url']).data['success']['offset'], 6)
+        response = self.client.post(reverse('chunked-upload'), {'filename': 'statement.xlsx', 'size': 11}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_stale_uploads_expire(self):
+        stale = self.start()
+        self.send(stale, 0, b'data')
+        ChunkedUpload.objects.filter(id=stale['upload']).update(updated_at=timezone.now() - settings.CHUNKED_UPLOAD_EXPIRY - datetime.timedelta(minutes=1))
+        path = ChunkedUpload.objects.get(id=stale['upload']).file_path
+        recent = self.start()
+        self.assertFalse(ChunkedUpload.objects.filter(id=stale['upload']).exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(ChunkedUpload.objects.filter(id=recent['upload']).exists())
+
+    def test_finalize_in_background(self):
+        upload = self.start()
+        self.send(upload, 0, self.content)
+        response = self.client.post(reverse('chunked-upload-finalize', args=[upload['upload']]) + '?async=1')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        job = run_next_job()
+        self.assertEqual(job.state, 'DONE')
+        self.assertEqual(job.inserted, 400)
+        self.assertFalse(os.path.exists(job.file_path))
+
+    def test_upload_of_other_user(self):
+        upload = self.start()
+        other = User.objects.create(email="other@example.com", password="Test@123", arn_number=12345, first_name="Test")
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.get_jwt_token(other))
+        self.assertEqual(self.client.get(upload['upload_url']).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.send(upload, 0, b'data').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MultiSheetUploadTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('upload-transaction')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+        self.df = synthetic_statement(90)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def workbook(self, sheets):
+        file = BytesIO()
+        with pd.ExcelWriter(file) as writer:
+            for name, df in sheets.items():
+                df.to_excel(writer, sheet_name=name, index=False)
+        file.name = 'statement.xlsx'
+        file.seek(0)
+        return file
+
+    def test_sheets_are_read_in_order(self):
+        file = self.workbook({'AMC 1': self.df.iloc[:30], 'Empty': pd.DataFrame(), 'AMC 2': self.df.iloc[30:]})
+        chunks = list(read_excel_chunks(file, chunk_size=25, workers=2))
+        self.assertEqual([chunk.attrs['sheet'] for chunk in chunks], ['AMC 1', 'AMC 1', 'AMC 2', 'AMC 2', 'AMC 2'])
+        self.assertEqual(list(pd.concat(chunks)['Product']), list(self.df['Product']))
+
+    def test_workers_spill_chunks_to_disk(self):
+        file = self.workbook({'AMC 1': self.df})
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        paths = parse_sheet(file.getvalue(), 'AMC 1', UPLOAD_HEADERS, 25, directory)
+        self.assertEqual(sorted(paths), sorted(os.path.join(directory, name) for name in os.listdir(directory)))
+        chunks = [pd.read_pickle(path) for path in paths]
+        self.assertEqual([len(chunk) for chunk in chunks], [25, 25, 25, 15])
+        self.assertEqual(chunks[1].attrs['rows'], list(range(27, 52)))
+        self.assertEqual(list(pd.concat(chunks)['Product']), list(self.df['Product']))
+
+    def test_multi_sheet_upload(self):
+        file = self.workbook({'AMC 1': self.df.iloc[:30], 'AMC 2': self.df.iloc[30:60], 'AMC 3': self.df.iloc[60:]})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['inserted'], 90)
+
+    def test_errors_name_the_sheet(self):
+        bad = self.df.iloc[30:].copy()
+        bad.iloc[2, bad.columns.get_loc('Asset Class')] = 'Gold'
+        file = self.workbook({'AMC 1': self.df.iloc[:30], 'AMC 2': bad})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'], [{'row': 4, 'column': 'Asset Class', 'error': 'Asset Class must be one of Equity, Debt, Alternate.', 'sheet': 'AMC 2'}])
+        self.assertEqual(Transaction.objects.count(), 0)
+
+
 class UpdateTransactionViewTest(APITestCase):
     def setUp(self):
         self.url = reverse('view-transaction')
@@ -79,11 +734,13 @@ class UpdateTransactionViewTest(APITestCase):
         transaction1 = self.update_transactions(self.user, 'PRODUCT__1', "EQUITY", "2024-1-23", 10, 1000)
         transaction2 = self.update_transactions(self.user, 'PRODUCT__1', "EQUITY", "2024-1-23", 10, 2000)
         transaction1.save()
-        transaction2.save()
+        # same product on same day is rejected by the unique constraint.
+        with self.assertRaises(IntegrityError), db_transaction.atomic():
+            transaction2.save()
         count = Transaction.objects.filter(product='PRODUCT__1', date_of_transaction='2024-1-23').count()
         self.assertEqual(transaction1.amount, 1000)
         self.assertEqual(transaction2.amount, 2000)
-        self.assertEqual(count, 2)
+        self.assertEqual(count, 1)
         
 class TransactionsViewTests(APITestCase):
     def setUp(self):
@@ -109,13 +766,11 @@ class TransactionsViewTests(APITestCase):
             asset_class = random.choice(asset_classes)
             product = random.choice(products)
             date = datetime.datetime.strptime(f"{year}-{month}-{day}", "%Y-%m-%d")  
-            Transaction.objects.create(
+            Transaction.objects.update_or_create(
                 user=user,
                 product=product,
-                asset_class=asset_class,
                 date_of_transaction=date,
-                units=unit,
-                amount=amount
+                defaults={"asset_class": asset_class, "units": unit, "amount": amount}
             )
             
     def test_view_transactions(self):
@@ -129,6 +784,488 @@ class TransactionsViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class TransactionPaginationTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('view-transaction')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.other = User.objects.create(email="other@example.com", password="Test@123", arn_number=12345, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+        # 5 products on each of 6 days, several rows share a date so the id breaks ties.
+        start = timezone.make_aware(datetime.datetime(2024, 3, 29))
+        for day in range(6):
+            for product in range(5):
+                Transaction.objects.create(
+                    user=self.user,
+                    product=f'PRODUCT_{product}',
+                    asset_class=['EQUITY', 'DEBT'][product % 2],
+                    date_of_transaction=start + datetime.timedelta(days=day),
+                    units=1,
+                    amount=100,
+                )
+        Transaction.objects.create(user=self.other, product='PRODUCT_0', asset_class='EQUITY', date_of_transaction=start, units=1, amount=1)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def pages(self, url):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        rows = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            rows.extend(response.data['success'])
+            url = response.data['next']
+        return rows
+
+    def test_pages_cover_every_row_once_in_order(self):
+        rows = self.pages(self.url + '?page_size=7')
+        expected = list(Transaction.objects.filter(user=self.user).order_by('date_of_transaction', 'id').values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in rows], [str(id) for id in expected])
+
+    def test_last_page_has_no_next(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        response = self.client.get(self.url + '?page_size=30')
+        self.assertEqual(len(response.data['success']), 30)
+        self.assertIsNone(response.data['next'])
+
+    def test_filters(self):
+        self.assertEqual(len(self.pages(self.url + '?page_size=4&product=PRODUCT_1')), 6)
+        # the key or the label of an asset class, in any case.
+        self.assertEqual(len(self.pages(self.url + '?page_size=4&asset_class=debt')), 12)
+        self.assertEqual(len(self.pages(self.url + '?asset_class=EQUITY')), 18)
+        self.assertEqual(len(self.pages(self.url + '?date_from=2024-03-30&date_to=2024-03-31')), 10)
+        self.assertEqual(len(self.pages(self.url + '?page_size=3&date_from=2024-04-02&product=PRODUCT_4')), 2)
+
+    def test_stream_json(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        response = self.client.get(self.url + '?stream=1&product=PRODUCT_1')
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['id'] for row in body['success']], [row['id'] for row in self.pages(self.url + '?product=PRODUCT_1')])
+
+    def test_stream_ndjson(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        response = self.client.get(self.url, HTTP_ACCEPT='application/x-ndjson')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(rows, json.loads(json.dumps(self.pages(self.url))))
+
+        response = self.client.get(self.url + '?format=ndjson&asset_class=Gold')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sparse_fields(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + '?page_size=4&fields=amount,product,date_of_transaction')
+        self.assertEqual(list(response.data['success'][0]), ['product', 'date_of_transaction', 'amount'])
+        select = [query['sql'] for query in queries.captured_queries if 'FROM "transaction_transaction"' in query['sql']][-1]
+        self.assertNotIn('"units"', select.split('FROM')[0])
+
+        # paging still works without the ordering fields in the payload.
+        rows = self.pages(self.url + '?page_size=4&fields=product')
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(set(rows[0]), {'product'})
+
+        response = self.client.get(self.url + '?fields=product,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_parameters(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        for query in ('cursor=abc', 'fields=nope', 'page_size=0', 'page_size=ten', 'date_from=yesterday', 'asset_class=Gold'):
+            response = self.client.get(self.url + '?' + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+            self.assertIn('error', response.data)
+
+    def test_impossible_dates(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        for query in ('date_from=2024-02-30T10:00:00', 'date_to=2024-02-30T10:00:00', 'date_to=2024-13-01', 'date_from=2024-01-01T25:00:00'):
+            response = self.client.get(self.url + '?' + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+            self.assertIn('error', response.data)
+
+
+class ValuesSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        rows = [
+            ('PRODUCT_1', 'EQUITY', datetime.datetime(2024, 3, 31, 18, 30, tzinfo=datetime.timezone.utc), '-12.5', '0.0001'),
+            ('PRODUCT_2', 'Debt', datetime.datetime(2024, 4, 1, tzinfo=datetime.timezone.utc), '999999.9999', '-100'),
+            ('', 'ALTERNATE', datetime.datetime(2020, 1, 1, 5, 45, 12, 250000, tzinfo=datetime.timezone.utc), '0', '7'),
+        ]
+        for product, asset_class, date, amount, units in rows:
+            Transaction.objects.create(user=self.user, product=product, asset_class=asset_class, date_of_transaction=date, amount=amount, units=units)
+
+    def render_both(self):
+        queryset = Transaction.objects.order_by('date_of_transaction', 'id')
+        serializer = ValuesSerializer(TransactionSerializer)
+        expected = JSONRenderer().render(TransactionSerializer(queryset, many=True).data)
+        fast = JSONRenderer().render(serializer.to_representation(serializer.values(queryset)))
+        return expected, fast
+
+    def test_same_bytes_as_model_serializer(self):
+        expected, fast = self.render_both()
+        self.assertEqual(fast, expected)
+
+    def test_same_bytes_in_utc(self):
+        with timezone.override(datetime.timezone.utc):
+            expected, fast = self.render_both()
+        self.assertIn(b'Z"', fast)
+        self.assertEqual(fast, expected)
+
+
+class FinancialYearSummaryTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('upload-transaction')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def upload(self, df):
+        UploadFingerprint.objects.all().delete()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        return self.client.post(self.url, {'file': statement_file(df, 'csv')}, format='multipart')
+
+    def test_uploads_keep_summary_in_step(self):
+        df = synthetic_statement(600)
+        self.upload(df)
+        self.assertTrue(FinancialYearSummary.objects.filter(user=self.user).exists())
+        self.assertEqual(summary_mismatches(), [])
+
+        # amounts and asset classes change on re-upload.
+        df['Amount'] = df['Amount'] * 2
+        df.loc[::3, 'Asset Class'] = 'Debt'
+        self.upload(df)
+        self.assertEqual(summary_mismatches(), [])
+
+    def test_edits_keep_summary_in_step(self):
+        self.upload(synthetic_statement(200))
+        transaction = Transaction.objects.filter(user=self.user).first()
+        transaction.amount = 123.45
+        transaction.asset_class = 'Debt'
+        transaction.date_of_transaction = datetime.datetime(2010, 1, 5)
+        transaction.save()
+        self.assertEqual(summary_mismatches(), [])
+
+        Transaction.objects.create(user=self.user, product='NEW', asset_class='EQUITY', date_of_transaction=timezone.now(), units=1, amount=10)
+        transaction.delete()
+        self.assertEqual(summary_mismatches(), [])
+
+        Transaction.objects.filter(user=self.user, product__in=['PRODUCT_00001', 'NEW']).delete()
+        self.assertEqual(summary_mismatches(), [])
+
+        Transaction.objects.filter(user=self.user).delete()
+        self.assertFalse(FinancialYearSummary.objects.filter(user=self.user).exists())
+
+    def test_bulk_updates_keep_summary_in_step(self):
+        self.upload(synthetic_statement(200))
+        version = data_version(self.user.pk)
+        Transaction.objects.filter(user=self.user, product='PRODUCT_00001').update(amount=99)
+        self.assertEqual(summary_mismatches(), [])
+        # the update changes the column the queryset filters on.
+        self.assertTrue(Transaction.objects.filter(user=self.user, asset_class='EQUITY').update(asset_class='DEBT'))
+        self.assertEqual(summary_mismatches(), [])
+        Transaction.objects.filter(user=self.user).update(units=7)
+        self.assertEqual(data_version(self.user.pk), version + 3)
+        # updating nothing changes nothing.
+        Transaction.objects.filter(user=self.user, product='NONE').update(amount=1)
+        self.assertEqual(data_version(self.user.pk), version + 3)
+
+    def test_upload_locks_user_before_reading(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.upload(synthetic_statement(20))
+        tables = [query['sql'] for query in queries.captured_queries if 'transaction_dataversion' in query['sql'] or 'FROM "transaction_transaction"' in query['sql']]
+        self.assertIn('transaction_dataversion', tables[0])
+
+    def test_failed_upload_leaves_summary(self):
+        self.upload(synthetic_statement(100))
+        before = list(FinancialYearSummary.objects.values_list('fiscal_year', 'asset_class', 'amount', 'transactions'))
+        df = synthetic_statement(100, seed=3).astype({'Units': object})
+        df.loc[50, 'Units'] = 'many'
+        self.assertEqual(self.upload(df).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(FinancialYearSummary.objects.values_list('fiscal_year', 'asset_class', 'amount', 'transactions')), before)
+
+    def test_rebuild_command(self):
+        self.upload(synthetic_statement(300))
+        FinancialYearSummary.objects.filter(user=self.user).update(amount=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_summaries', '--verify', stdout=StringIO())
+        call_command('rebuild_summaries', stdout=StringIO())
+        call_command('rebuild_summaries', '--verify', stdout=StringIO())
+        self.assertEqual(summary_mismatches(), [])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        self.upload(synthetic_statement(100))
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def upload(self, df):
+        return self.client.post(reverse('upload-transaction'), {'file': statement_file(df, 'csv')}, format='multipart')
+
+    def transaction_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        reads = [query for query in queries.captured_queries if 'transaction_transaction' in query['sql'] or 'transaction_financialyearsummary' in query['sql']]
+        return response, len(reads)
+
+    def check_cached_until_upload(self):
+        for url in (reverse('summary'), reverse('view-transaction') + '?page_size=10'):
+            first, reads = self.transaction_queries(url)
+            self.assertEqual(reads, 1)
+            second, reads = self.transaction_queries(url)
+            self.assertEqual(reads, 0)
+            self.assertEqual(second.content, first.content)
+
+        # other parameters are cached apart.
+        response, reads = self.transaction_queries(reverse('view-transaction') + '?page_size=5')
+        self.assertEqual(reads, 1)
+        self.assertEqual(len(response.json()['success']), 5)
+
+        version = data_version(self.user.pk)
+        self.upload(synthetic_statement(150))
+        self.assertEqual(data_version(self.user.pk), version + 1)
+        response, reads = self.transaction_queries(reverse('view-transaction') + '?page_size=1000')
+        self.assertEqual(reads, 1)
+        self.assertEqual(len(response.json()['success']), 150)
+
+    def test_locmem_cache(self):
+        self.check_cached_until_upload()
+
+    def test_file_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        responses = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        with self.settings(CACHES={**settings.CACHES, 'responses': responses}):
+            self.check_cached_until_upload()
+            self.assertTrue(os.listdir(location))
+
+    def test_edits_bump_version(self):
+        version = data_version(self.user.pk)
+        transaction = Transaction.objects.filter(user=self.user).first()
+        transaction.units = 5
+        transaction.save()
+        transaction.delete()
+        # deleting nothing changes nothing.
+        Transaction.objects.filter(user=self.user, product='NONE').delete()
+        Transaction.objects.filter(user=self.user).delete()
+        self.assertEqual(data_version(self.user.pk), version + 3)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        self.client.post(reverse('upload-transaction'), {'file': statement_file(synthetic_statement(50), 'csv')}, format='multipart')
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def revalidate(self, url, etag):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        reads = [query for query in queries.captured_queries if 'transaction_transaction' in query['sql'] or 'transaction_financialyearsummary' in query['sql']]
+        return response, len(reads)
+
+    def test_not_modified_until_data_changes(self):
+        urls = (reverse('summary'), reverse('view-transaction') + '?page_size=10', reverse('view-transaction') + '?stream=1')
+        for url in urls:
+            response = self.client.get(url)
+            etag = response['ETag']
+            self.assertIn('no-cache', response['Cache-Control'])
+            response, reads = self.revalidate(url, etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(reads, 0)
+            self.assertFalse(response.content)
+            # weak validators and lists of them match too.
+            response, _ = self.revalidate(url, f'"other", W/{etag}')
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        etag = self.client.get(urls[1])['ETag']
+        # other parameters and formats have their own tags.
+        self.assertNotEqual(self.client.get(reverse('view-transaction') + '?page_size=5')['ETag'], etag)
+        self.assertNotEqual(self.client.get(urls[1], HTTP_ACCEPT='application/x-ndjson')['ETag'], etag)
+
+        Transaction.objects.filter(user=self.user).first().delete()
+        response, _ = self.revalidate(urls[1], etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['success']), 10)
+
+    def test_one_user_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('summary'))
+        self.assertEqual(len([query for query in queries.captured_queries if 'assets_user' in query['sql']]), 1)
+
+    def test_claims_need_no_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(add_user_claims(RefreshToken.for_user(self.user), self.user).access_token))
+        for url in (reverse('summary'), reverse('returns'), reverse('view-transaction')):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse([query for query in queries.captured_queries if 'assets_user' in query['sql']])
+
+        # uploads write rows for the user and load it.
+        response = self.client.post(reverse('upload-transaction'), {'file': statement_file(synthetic_statement(60), 'csv')}, format='multipart')
+        self.assertEqual(response.json()['user'], 54321)
+
+    def test_tags_are_per_user(self):
+        etag = self.client.get(reverse('summary'))['ETag']
+        other = User.objects.create(email="other@example.com", password="Test@123", arn_number=12345, first_name="Other")
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.get_jwt_token(other))
+        response = self.client.get(reverse('summary'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_errors_carry_no_tag(self):
+        response = self.client.get(reverse('view-transaction') + '?date_from=never')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('ETag', response)
+
+
+class XirrTests(APITestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        self.url = reverse('returns')
+        self.user = User.objects.create(email="user@example.com", password="Test@123", arn_number=54321, first_name="Test")
+        self.user_token = self.get_jwt_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def add(self, product, asset_class, date, amount):
+        Transaction.objects.create(user=self.user, product=product, asset_class=asset_class, amount=amount, units=1,
+                                   date_of_transaction=timezone.make_aware(datetime.datetime.fromisoformat(date)))
+
+    def test_known_rates(self):
+        # 10% over exactly one year, and money doubled over two years.
+        self.add('PRODUCT_A', 'EQUITY', '2023-01-01', -1000)
+        self.add('PRODUCT_A', 'EQUITY', '2024-01-01', 1100)
+        self.add('PRODUCT_B', 'DEBT', '2022-01-01', -1000)
+        self.add('PRODUCT_B', 'DEBT', '2024-01-01', 2000)
+        # only money put in, there is no rate.
+        self.add('PRODUCT_C', 'DEBT', '2024-01-01', -500)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        returns = response.json()['success']
+        self.assertAlmostEqual(returns['products']['PRODUCT_A'], 0.1, places=5)
+        self.assertAlmostEqual(returns['products']['PRODUCT_B'], 2 ** (365 / 730) - 1, places=5)
+        self.assertIsNone(returns['products']['PRODUCT_C'])
+        self.assertAlmostEqual(returns['asset_classes']['Equity'], 0.1, places=5)
+        days = [19358, 19723, 18993, 19723, 19723]
+        self.assertAlmostEqual(returns['asset_classes']['Debt'], scalar_xirr(days[2:], [-1000, 2000, -500]), places=5)
+        self.assertAlmostEqual(returns['portfolio'], scalar_xirr(days, [-1000, 1100, -1000, 2000, -500]), places=5)
+
+    def test_empty_portfolio(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['success'], {"portfolio": None, "asset_classes": {}, "products": {}})
+
+    def test_matches_scalar_reference(self):
+        # random flows over decades: some series are solved by Newton, some need bisection, some have no rate.
+        rng = np.random.default_rng(0)
+        groups = np.repeat(np.arange(300), 20)
+        days = rng.integers(0, 20000, len(groups))
+        amounts = rng.uniform(-10000, 10000, len(groups))
+        rates = xirr(groups, days, amounts, 300)
+        for group, rate in enumerate(rates):
+            expected = scalar_xirr(days[groups == group].tolist(), amounts[groups == group].tolist())
+            if np.isnan(expected):
+                self.assertTrue(np.isnan(rate))
+            else:
+                self.assertAlmostEqual(rate, expected, delta=1e-6 * max(1, abs(expected)))
+        self.assertTrue(np.isnan(rates).any())
+        self.assertFalse(np.isnan(rates).all())
+
+    def test_reads_transactions_once(self):
+        self.client.post(reverse('upload-transaction'), {'file': statement_file(synthetic_statement(500), 'csv')}, format='multipart')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['success']['products']), 10)
+        self.assertEqual(len([query for query in queries.captured_queries if 'transaction_transaction' in query['sql']]), 1)
+
+
+class AllSummariesTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('all-summaries')
+        self.admin = User.objects.create(email="admin@example.com", password="Test@123", arn_number=99999, first_name="Admin", is_superuser=True, is_staff=True)
+        self.users = [
+            User.objects.create(email=f"user{arn_number}@example.com", password="Test@123", arn_number=arn_number, first_name="Test")
+            for arn_number in (111, 222, 333)
+        ]
+        for user in self.users:
+            self.upload(user, synthetic_statement(user.arn_number))
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.get_jwt_token(self.admin))
+
+    def get_jwt_token(self, user):
+        refresh = RefreshToken.for_user(user)
+        return str(refresh.access_token)
+
+    def upload(self, user, df):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.get_jwt_token(user))
+        self.client.post(reverse('upload-transaction'), {'file': statement_file(df, 'csv')}, format='multipart')
+
+    def expected(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.get_jwt_token(user))
+        summary = self.client.get(reverse('summary')).json()['success']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.get_jwt_token(self.admin))
+        return summary
+
+    def test_every_user_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len([query for query in queries.captured_queries if 'transaction_' in query['sql']]), 1)
+        summaries = json.loads(content)['success']
+        self.assertEqual([summary['arn_number'] for summary in summaries], [111, 222, 333])
+        for user, summary in zip(self.users, summaries):
+            self.assertEqual(summary['summary'], self.expected(user))
+
+    def test_chosen_users(self):
+        response = self.client.get(self.url, {'arn_numbers': '333, 111,404'})
+        summaries = json.loads(b''.join(response.streaming_content))['success']
+        self.assertEqual([summary['arn_number'] for summary in summaries], [111, 333])
+
+        response = self.client.get(self.url, {'arn_numbers': 'ARN-111'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_csv(self):
+        response = self.client.get(self.url, {'format': 'csv', 'arn_numbers': '222'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = pd.read_csv(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(list(rows.columns), ['arn_number', 'financial_year', 'Equity', 'Debt', 'Alternate'])
+        expected = self.expected(self.users[1])
+        self.assertEqual(list(rows['financial_year']), list(expected))
+        for row in rows.itertuples():
+            self.assertAlmostEqual(row.Equity, float(expected[row.financial_year]['Equity']), places=4)
+
+        response = self.client.get(self.url, HTTP_ACCEPT='text/csv')
+        self.assertEqual(set(pd.read_csv(BytesIO(b''.join(response.streaming_content)))['arn_number']), {111, 222, 333})
+
+    def test_admin_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.get_jwt_token(self.users[0]))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class SummaryTests(APITestCase):
     def setUp(self):
         self.url = reverse('summary')
@@ -153,13 +1290,11 @@ class SummaryTests(APITestCase):
             asset_class = random.choice(asset_classes)
             product = random.choice(products)
             date = datetime.datetime.strptime(f"{year}-{month}-{day}", "%Y-%m-%d")  
-            Transaction.objects.create(
+            Transaction.objects.update_or_create(
                 user=user,
                 product=product,
-                asset_class=asset_class,
                 date_of_transaction=date,
-                units=unit,
-                amount=amount
+                defaults={"asset_class": asset_class, "units": unit, "amount": amount}
             )
     def test_get_summary(self):
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
@@ -167,6 +1302,32 @@ class SummaryTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('success', response.data)
 
+    def test_financial_year_boundaries(self):
+        Transaction.objects.all().delete()
+        ist = zoneinfo.ZoneInfo('Asia/Kolkata')
+        rows = [
+            # last moment of FY23-24 and first of FY24-25 in Indian time.
+            (datetime.datetime(2024, 3, 31, 23, 59, tzinfo=ist), 'EQUITY', 100),
+            (datetime.datetime(2024, 4, 1, 0, 0, tzinfo=ist), 'EQUITY', 200),
+            # still 31 December in UTC but 1 January in India.
+            (datetime.datetime(2023, 12, 31, 19, 0, tzinfo=datetime.timezone.utc), 'Debt', 50),
+            (datetime.datetime(2024, 6, 1, tzinfo=ist), 'ALTERNATE', -25.5),
+        ]
+        for date, asset_class, amount in rows:
+            Transaction.objects.create(user=self.user, product=f'PRODUCT_{amount}', asset_class=asset_class, date_of_transaction=date, units=1, amount=amount)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_token)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        # one indexed read of the summary table, transactions are not touched.
+        tables = [query['sql'] for query in queries.captured_queries if 'transaction_transaction' in query['sql'] or 'transaction_financialyearsummary' in query['sql']]
+        self.assertEqual(len(tables), 1)
+        self.assertIn('transaction_financialyearsummary', tables[0])
+        summary = response.data['success']
+        self.assertEqual(list(summary), ['FY24-25', 'FY23-24'])
+        self.assertEqual(summary['FY24-25'], {'Equity': 200, 'Debt': 0, 'Alternate': -25.5})
+        self.assertEqual(summary['FY23-24'], {'Equity': 100, 'Debt': 50, 'Alternate': 0})
+
     def test_unauthorized_access(self):
         response = self.client.get(self.url)        
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
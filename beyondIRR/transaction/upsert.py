@@ -0,0 +1,136 @@
+from django.db import transaction as db_transaction
+from decimal import Decimal
+from django.utils import timezone
+import sys
+import pandas as pd
+from .models import Transaction, UPLOAD_HEADERS
+from .summary import add_delta, apply_summary_deltas
+from .versions import bump_data_version, lock_data_version
+
+# changed rows written per INSERT ... ON CONFLICT statement.
+UPSERT_BATCH_SIZE = 1000
+UPDATE_FIELDS = ['asset_class', 'units', 'amount']
+UNIQUE_FIELDS = ['user', 'product', 'date_of_transaction']
+# existing rows are streamed from the database this many at a time.
+EXISTING_CHUNK_SIZE = 5000
+
+PRODUCT_FIELD = Transaction._meta.get_field('product')
+DATE_FIELD = Transaction._meta.get_field('date_of_transaction')
+UNITS_FIELD = Transaction._meta.get_field('units')
+AMOUNT_FIELD = Transaction._meta.get_field('amount')
+DECIMAL_PLACES = Decimal(1).scaleb(-AMOUNT_FIELD.decimal_places)
+
+
+# spreadsheet dates come without timezone, read them in project timezone like the ORM would.
+def normalize_date(value):
+    if pd.isna(value):
+        raise ValueError('Date is missing for one or more rows.')
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    value = DATE_FIELD.to_python(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def to_decimal(field, value):
+    # rounded the way the database stores it, so values read back compare equal.
+    return field.to_python(value).quantize(DECIMAL_PLACES)
+
+
+def build_transaction(user, product, asset_class, date, amount, units):
+    return Transaction(
+        user=user,
+        product=PRODUCT_FIELD.to_python(product),
+        asset_class=asset_class,
+        date_of_transaction=normalize_date(date),
+        units=to_decimal(UNITS_FIELD, units),
+        amount=to_decimal(AMOUNT_FIELD, amount),
+    )
+
+
+# what one transaction takes in the upload's key map: a hash of (asset_class, units, amount) to tell changed rows
+# from unchanged ones, plus the asset class (one shared string) and the amount in units of its last decimal place
+# to take the row out of the summary when it is replaced.
+def row_entry(asset_class, units, amount):
+    return hash((asset_class, units, amount)), sys.intern(asset_class), int(amount.scaleb(AMOUNT_FIELD.decimal_places))
+
+
+def entry_amount(entry):
+    return Decimal(entry[2]).scaleb(-AMOUNT_FIELD.decimal_places)
+
+
+# hash(product, date) -> row_entry() of every transaction the user already has, in one query. hashes and small ints
+# keep this to a fraction of what the rows themselves would take, 100k rows take about 22 MB.
+def existing_transactions(user):
+    rows = Transaction.objects.filter(user=user).values_list('product', 'date_of_transaction', 'asset_class', 'units', 'amount')
+    return {
+        hash((product, date)): row_entry(asset_class, units, amount)
+        for product, date, asset_class, units, amount in rows.iterator(chunk_size=EXISTING_CHUNK_SIZE)
+    }
+
+
+def write_batch(objs):
+    Transaction.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=UNIQUE_FIELDS,
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+# diffs every row of the given dataframes against what the user already has and writes only new
+# (product, date) pairs and rows whose values changed, all inside one database transaction together
+# with the change to the financial year summary. a pair repeated in a later dataframe overwrites the
+# earlier row and is counted once as a duplicate, by how its last row compares to what the user had before.
+def upsert_transactions(user, frames, batch_size=UPSERT_BATCH_SIZE):
+    with db_transaction.atomic():
+        # a retry arriving while the first upload is still being written waits for it, then diffs against its rows
+        # and adds nothing to the summary twice.
+        lock_data_version(user.pk)
+        existing = existing_transactions(user)
+        # a key the upload has seen maps to (its entry before the upload or None, its entry now) instead, so a
+        # repeat in a later dataframe is counted against what the user had before.
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "duplicates": 0}
+        pending = {}
+        deltas = {}
+        for df in frames:
+            for row in df[UPLOAD_HEADERS].itertuples(index=False, name=None):
+                obj = build_transaction(user, *row)
+                key = hash((obj.product, obj.date_of_transaction))
+                entry = row_entry(obj.asset_class, obj.units, obj.amount)
+                state = existing.get(key)
+                if state is not None and len(state) == 2:
+                    before, current = state
+                    counts["duplicates"] += 1
+                    counts[change(before, current)] -= 1
+                else:
+                    before = current = state
+                counts[change(before, entry)] += 1
+                if current is not None and current[0] == entry[0]:
+                    existing[key] = (before, current)
+                    continue
+
+                existing[key] = (before, entry)
+                if current is not None:
+                    add_delta(deltas, obj.date_of_transaction, current[1], -entry_amount(current), -1)
+                add_delta(deltas, obj.date_of_transaction, obj.asset_class, obj.amount, 1)
+                # same (product, date) twice in one statement is rejected by the backend, last row wins.
+                pending[key] = obj
+                if len(pending) >= batch_size:
+                    write_batch(list(pending.values()))
+                    pending = {}
+        if pending:
+            write_batch(list(pending.values()))
+        apply_summary_deltas(user.pk, deltas)
+        if counts["inserted"] or counts["updated"]:
+            bump_data_version(user.pk)
+
+    return counts
+
+
+# how a row of the upload changed what the user had.
+def change(before, entry):
+    if before is None:
+        return "inserted"
+    return "unchanged" if before[0] == entry[0] else "updated"
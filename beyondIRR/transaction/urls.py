@@ -1,8 +1,14 @@
 from django.urls import path
-from .views import TransactionView, AddTransactionView, Summary
+from .views import TransactionView, AddTransactionView, UploadJobView, ChunkedUploadView, ChunkedUploadDetailView, ChunkedUploadFinalizeView, Summary, AllSummaries, Returns
 
 urlpatterns = [
     path('transactions/upload/', AddTransactionView.as_view(), name='upload-transaction'),
+    path('transactions/jobs/<uuid:job_id>/', UploadJobView.as_view(), name='upload-job'),
+    path('transactions/uploads/', ChunkedUploadView.as_view(), name='chunked-upload'),
+    path('transactions/uploads/<uuid:upload_id>/', ChunkedUploadDetailView.as_view(), name='chunked-upload-detail'),
+    path('transactions/uploads/<uuid:upload_id>/finalize/', ChunkedUploadFinalizeView.as_view(), name='chunked-upload-finalize'),
     path('transactions/view/', TransactionView.as_view(), name='view-transaction'),
     path('summary/', Summary.as_view(), name='summary'),
+    path('summary/all/', AllSummaries.as_view(), name='all-summaries'),
+    path('returns/', Returns.as_view(), name='returns'),
 ]
@@ -0,0 +1,147 @@
+from django.utils import timezone
+import warnings
+import numpy as np
+import pandas as pd
+from .models import Transaction, ASSET_CHOICES, UPLOAD_HEADERS
+
+# only the first errors are sent back, the count covers the whole file.
+MAX_REPORTED_ERRORS = 100
+
+# both the stored key and the label people type are accepted, case does not matter.
+ASSET_CLASS_KEYS = {}
+for key, label in ASSET_CHOICES:
+    ASSET_CLASS_KEYS[key.lower()] = key
+    ASSET_CLASS_KEYS[label.lower()] = key
+
+PRODUCT_MAX_LENGTH = Transaction._meta.get_field('product').max_length
+AMOUNT_FIELD = Transaction._meta.get_field('amount')
+# largest absolute value a DecimalField(max_digits, decimal_places) can hold.
+DECIMAL_LIMIT = 10 ** (AMOUNT_FIELD.max_digits - AMOUNT_FIELD.decimal_places)
+
+
+class UploadValidationError(Exception):
+    def __init__(self, error_count, errors):
+        super().__init__('One or more rows are invalid')
+        self.error_count = error_count
+        self.errors = errors
+
+
+def to_aware(dates):
+    if dates.dt.tz is None:
+        return dates.dt.tz_localize(timezone.get_current_timezone(), ambiguous='NaT', nonexistent='NaT')
+    return dates.dt.tz_convert(timezone.get_current_timezone())
+
+
+# a UTC offset (or Z) after the time of a date string, e.g. 10:30:00+05:30.
+OFFSET_PATTERN = r'\d:\d{2}(?::\d{2}(?:[.,]\d+)?)?\s*(?:[zZ]|[+-]\d{2}(?::?\d{2})?)$'
+
+
+# values with an offset keep their instant, ones without are read in project timezone.
+def parse_split(text, format):
+    has_offset = text.str.contains(OFFSET_PATTERN, na=False).astype(bool)
+    aware = pd.to_datetime(text.where(has_offset), format=format, errors='coerce', utc=True)
+    naive = to_aware(pd.to_datetime(text.where(~has_offset), format=format, errors='coerce'))
+    return aware.where(has_offset, naive.dt.tz_convert('UTC'))
+
+
+# every value is read on its own, so rows are accepted whatever the other values of the chunk look like. ISO 8601
+# in any shape is parsed at once, other date formats value by value.
+def parse_dates(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return to_aware(values)
+    try:
+        # pandas reads values without an offset as UTC when others of the chunk have one, and mixed offsets
+        # give an object column, both are parsed again split by offset.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            dates = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    except (TypeError, ValueError):
+        dates = None
+    if dates is not None and pd.api.types.is_datetime64_dtype(dates):
+        dates = to_aware(dates)
+    else:
+        dates = to_aware(parse_split(date_text(values), 'ISO8601'))
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates = dates.copy()
+        dates[retry] = to_aware(parse_split(date_text(values[retry]), 'mixed'))
+    return dates
+
+
+def date_text(values):
+    return values.astype(str).str.strip().where(values.notna())
+
+
+# checks and normalizes whole columns of a chunk at once, bad rows are reported and dropped.
+class UploadValidator:
+    def __init__(self):
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+        # rows repeating a (product, date) of their own chunk, repeats across chunks are counted by the writer.
+        self.duplicates = 0
+
+    def report(self, rows, column, message, sheet=None):
+        self.error_count += len(rows)
+        for row in rows[:MAX_REPORTED_ERRORS - len(self.errors)]:
+            error = {"row": int(row), "column": column, "error": message}
+            if sheet:
+                error["sheet"] = sheet
+            self.errors.append(error)
+
+    def validate(self, df):
+        df = df[UPLOAD_HEADERS].reset_index(drop=True)
+        # row number in the file, header being row 1. Excel readers know the exact rows (and sheet) of a chunk.
+        if 'rows' in df.attrs:
+            row_numbers = np.asarray(df.attrs['rows'])
+        else:
+            row_numbers = df.index.to_numpy() + self.rows + 2
+        sheet = df.attrs.get('sheet')
+        self.rows += len(df)
+
+        product = df['Product'].where(df['Product'].isna(), df['Product'].astype(str).str.strip())
+        asset_class = df['Asset Class'].astype(str).str.strip().str.lower().map(ASSET_CLASS_KEYS)
+        date = parse_dates(df['Date'])
+        amount = pd.to_numeric(df['Amount'], errors='coerce')
+        units = pd.to_numeric(df['Units'], errors='coerce')
+
+        checks = [
+            ('Product', product.isna() | (product == ''), 'Product is missing.'),
+            ('Product', product.str.len() > PRODUCT_MAX_LENGTH, f'Product is longer than {PRODUCT_MAX_LENGTH} characters.'),
+            ('Asset Class', asset_class.isna(), 'Asset Class must be one of ' + ', '.join(label for _, label in ASSET_CHOICES) + '.'),
+            ('Date', date.isna(), 'Date is missing or not a valid date.'),
+            ('Amount', amount.isna(), 'Amount is missing or not a number.'),
+            ('Amount', amount.abs() >= DECIMAL_LIMIT, f'Amount must be less than {DECIMAL_LIMIT} in magnitude.'),
+            ('Units', units.isna(), 'Units is missing or not a number.'),
+            ('Units', units.abs() >= DECIMAL_LIMIT, f'Units must be less than {DECIMAL_LIMIT} in magnitude.'),
+        ]
+        invalid = pd.Series(False, index=df.index)
+        for column, mask, message in checks:
+            mask = mask.fillna(False).astype(bool)
+            if mask.any():
+                self.report(row_numbers[mask.to_numpy()], column, message, sheet)
+                invalid |= mask
+
+        clean = pd.DataFrame({
+            'Product': product,
+            'Asset Class': asset_class,
+            'Date': date,
+            'Amount': amount,
+            'Units': units,
+        })[~invalid]
+
+        # same product twice on a day, the later row wins like it would on re-upload.
+        unique = clean.drop_duplicates(subset=['Product', 'Date'], keep='last')
+        self.duplicates += len(clean) - len(unique)
+        return unique
+
+    # clean chunks for the writer, once a bad row is seen the rest is only validated to complete the report.
+    def clean_chunks(self, chunks):
+        for chunk in chunks:
+            clean = self.validate(chunk)
+            if not self.error_count and len(clean):
+                yield clean
+
+    def raise_for_errors(self):
+        if self.error_count:
+            raise UploadValidationError(self.error_count, self.errors)
@@ -0,0 +1,71 @@
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpResponse
+from assets.conditional import response_etag, not_modified, not_modified_response, set_etag
+import hashlib
+from .models import DataVersion
+
+
+def data_version(user_id):
+    return DataVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+
+def bump_data_version(user_id):
+    DataVersion.objects.bulk_create([DataVersion(user_id=user_id)], ignore_conflicts=True)
+    DataVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+
+
+# takes the user's DataVersion row until the database transaction ends, so writers of one user's transactions
+# run one at a time and each reads what the previous one wrote. the insert takes SQLite's write lock, which
+# select_for_update() does not.
+def lock_data_version(user_id):
+    DataVersion.objects.bulk_create([DataVersion(user_id=user_id)], ignore_conflicts=True)
+    DataVersion.objects.select_for_update().filter(user_id=user_id).values_list('version', flat=True).first()
+
+
+# (user, endpoint, query parameters, data version), parameters are hashed so keys stay short for every backend.
+# the user's uuid is used rather than the ARN number, a user created again never reads entries of the old one.
+def response_cache_key(user_id, endpoint, params, version):
+    query = '&'.join(f'{name}={value}' for name, values in sorted(params.lists()) for value in values)
+    return f"response:{endpoint}:{user_id}:{version}:{hashlib.sha256(query.encode()).hexdigest()}"
+
+
+# response of `build()` (a DRF Response or a streaming one) for data at the user's current version:
+# - a client already holding it (If-None-Match) gets 304 Not Modified, nothing is read or rendered.
+# - JSON bodies come from the responses cache, or are built, rendered and cached. a new data version makes
+#   new keys, entries of older versions are never read again and age out.
+# the browsable API renders per request things like the CSRF token and is left alone.
+def versioned_response(view, request, user, endpoint, build, cache=True):
+    if request.accepted_renderer.format == 'api':
+        return build()
+
+    version = data_version(user.pk)
+    etag = response_etag(str(user.id), endpoint, sorted(request.query_params.lists()), request.accepted_media_type, version)
+    if not_modified(request, etag):
+        return not_modified_response(etag)
+
+    if cache and request.accepted_renderer.format == 'json':
+        response = cached_json(view, request, user, endpoint, version, build)
+    else:
+        response = build()
+    if response.status_code == 200:
+        set_etag(response, etag)
+    return response
+
+
+def cached_json(view, request, user, endpoint, version, build):
+    responses = caches['responses']
+    key = response_cache_key(user.id, endpoint, request.query_params, version)
+    cached = responses.get(key)
+    if cached is not None:
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    response = build()
+    if response.status_code == 200:
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = view.get_renderer_context()
+        response.render()
+        responses.set(key, (response.content, response['Content-Type']))
+    return response
@@ -2,33 +2,73 @@ from django.shortcuts import render
 from rest_framework import generics
 from django.shortcuts import render
 from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
-from .models import Transaction, TransactionSerializer
-import pandas as pd
-from assets.decode_jwt import decode_jwt
-from assets.models import User
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from .models import Transaction, TransactionSerializer, UploadJob, ChunkedUpload, ASSET_LABELS
+from .ingest import ingest_upload, upload_error
+from .jobs import enqueue_upload, enqueue_file, job_status
+from .fingerprints import file_fingerprint, recorded_result, record_result
+from .pagination import filter_transactions, keyset_page, page_size, parse_arn_numbers, InvalidQueryError, ORDERING
+from .streaming import NDJSONRenderer, CSVRenderer, ndjson_stream, json_stream, json_items_stream, csv_stream
+from .serializers import ValuesSerializer
+from .summary import user_summary, all_user_summaries
+from .returns import user_returns
+from .versions import versioned_response
+from .chunked import start_upload, append_chunk, check_complete, remove_upload_file, OffsetMismatchError, UploadSizeError
+from django.core.files import File
+from django.urls import reverse
+from assets.authentication import user_row
+from assets.sparse_fields import requested_fields, readable_fields, InvalidFieldsError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from io import BytesIO
-import datetime
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.settings import api_settings
+from rest_framework.renderers import JSONRenderer
+from django.http import StreamingHttpResponse
+from itertools import groupby
+from operator import itemgetter
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-# helps to get the current user based on Auth token provided.
-def get_current_user(auth_header):
-    decoded_token = decode_jwt(auth_header)
-    user_id = decoded_token.get('user_id')
-    user = User.objects.get(id=user_id)
-    return user
+def upload_response(user, result, replayed=False):
+    return {"Success": 'Data uploaded for the user.', "user": user.arn_number, "inserted": result['inserted'], "updated": result['updated'], "unchanged": result['unchanged'], "duplicates": result['duplicates'], "replayed": replayed}
+
+
+# shared by the direct and the chunked upload, replays the earlier result of the same file, queues it when
+# async=1 is asked for (`enqueue` stores it for the upload worker) or processes it right away.
+def process_upload(request, user, file, content_type, fingerprint, enqueue):
+    # same file uploaded again (e.g. a retry after a timeout) gets the earlier result without reprocessing.
+    earlier_result = recorded_result(user, fingerprint)
+    if earlier_result:
+        return Response(upload_response(user, earlier_result, replayed=True), status=status.HTTP_200_OK)
+
+    # store the file and let the upload worker process it.
+    if request.query_params.get('async') in ('1', 'true'):
+        job = enqueue()
+        return Response({"job": str(job.id), "state": job.state, "status_url": reverse('upload-job', args=[job.id])}, status=status.HTTP_202_ACCEPTED)
+
+    try:
+        # file is streamed in fixed size chunks and validated column-wise, then new (product, date) rows
+        # are inserted and existing ones updated in batches.
+        result = ingest_upload(user, file, content_type)
+        record_result(user, fingerprint, result)
+
+        return Response(upload_response(user, result), status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response(upload_error(e), status=status.HTTP_400_BAD_REQUEST)
+
+
+def chunked_upload_status(upload):
+    return {"upload": str(upload.id), "filename": upload.filename, "size": upload.size, "offset": upload.offset, "state": upload.state}
 
 
 class TransactionView(generics.ListAPIView):
     serializer_class = TransactionSerializer
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
     @swagger_auto_schema(
         operation_summary="Retrieve User Transactions",
         operation_description="""
-        This endpoint retrieves a list of transactions for the authenticated user.
+        This endpoint retrieves the transactions of the authenticated user one page at a time, ordered by date of transaction.
         
         **Note:**
         Each product can only have one transaction per day for the authenticated user.
@@ -40,46 +80,88 @@ class TransactionView(generics.ListAPIView):
         Authorization: Bearer <your_token_here>
         ```
 
+        **Query Parameters:**
+        - **page_size**: Rows per page, 1000 by default and at most 10000.
+        - **cursor**: Position to continue from, take the `next` link of the previous page instead of building it.
+        - **date_from**, **date_to**: Only transactions in this range, a date (YYYY-MM-DD) or a datetime, both ends included.
+        - **product**: Only transactions of this product.
+        - **asset_class**: Only transactions of this asset class (Equity, Debt, Alternate).
+        - **fields**: Comma separated fields to return, e.g. `fields=product,date_of_transaction,amount`. Only those columns are read.
+        - **stream**: Set `stream=1` to get every matching transaction in one response instead of a page. Rows are written
+        as they are read from the database so the first byte arrives right away whatever the size. Send
+        `Accept: application/x-ndjson` (or `format=ndjson`) to get one JSON object per line instead.
+
+        **Conditional Requests:**
+        Responses carry an `ETag`, send it back in `If-None-Match` to get `304 Not Modified` while the transactions did not change.
+
         **Response:**
-        - **200 OK**: Returns a list of transactions for the user.
+        - **200 OK**: Returns a page of transactions for the user and the `next` page link, `null` on the last page.
+        Streamed, `{"success": [...]}` with every transaction, or one transaction per line for `application/x-ndjson`.
+        - **304 Not Modified**: `If-None-Match` holds the current `ETag`.
+        - **400 Bad Request**: A query parameter is invalid.
 
         **Example Response:**
         ```json
-        [
-            {
-                "id": 1,
-                "product": "Product A",
-                "asset_class": "Equity",
-                "date_of_transaction": "2024-08-18T12:00:00Z",
-                "units": 10,
-                "amount": 1000
-            },
-            {
-                "id": 2,
-                "product": "Product B",
-                "asset_class": "Debt",
-                "date_of_transaction": "2024-08-18T12:30:00Z",
-                "units": 5,
-                "amount": 500
-            }
-        ]
+        {
+            "success": [
+                {
+                    "id": 1,
+                    "product": "Product A",
+                    "asset_class": "Equity",
+                    "date_of_transaction": "2024-08-18T12:00:00Z",
+                    "units": 10,
+                    "amount": 1000
+                },
+                {
+                    "id": 2,
+                    "product": "Product B",
+                    "asset_class": "Debt",
+                    "date_of_transaction": "2024-08-18T12:30:00Z",
+                    "units": 5,
+                    "amount": 500
+                }
+            ],
+            "next": "http://127.0.0.1:8000/transactions/view/?cursor=WyIyMDI0LTA4LTE4VDEyOjMwOjAwKzAwOjAwIiwgIjIiXQ%3D%3D"
+        }
         ```
         """,
     )
     def get(self, request, *args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({"error": "Authorization header missing or invalid"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        user = get_current_user(auth_header)
+        user = request.user
 
-        if not user:
-            return Response({"error": "User Dont Exist"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            transactions = filter_transactions(Transaction.objects.filter(user_id=user.pk), request.query_params)
+            # rows are read with values_list() and rendered like TransactionSerializer would, without model instances.
+            # only the columns of the asked `fields` (and the ordering) are selected.
+            fields = requested_fields(request.query_params, readable_fields(self.get_serializer_class()))
+            serializer = ValuesSerializer(self.get_serializer_class(), fields, columns=ORDERING)
+            rows = serializer.values(transactions)
+        except (InvalidQueryError, InvalidFieldsError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # full history without paging, written row by row so memory stays flat.
+        if request.query_params.get('stream') in ('1', 'true') or request.accepted_renderer.format == 'ndjson':
+            return versioned_response(self, request, user, 'transactions', lambda: self.stream(request, rows, serializer), cache=False)
+
+        # pages are served from the response cache until the user's data changes.
+        return versioned_response(self, request, user, 'transactions', lambda: self.page(request, rows, serializer))
+
+    def stream(self, request, rows, serializer):
+        rows = rows.order_by(*ORDERING)
+        if request.accepted_renderer.format == 'ndjson':
+            return StreamingHttpResponse(ndjson_stream(rows, serializer.to_representation), content_type='application/x-ndjson')
+        return StreamingHttpResponse(json_stream(rows, serializer.to_representation), content_type='application/json')
+
+    def page(self, request, rows, serializer):
+        position = itemgetter(*(serializer.index(column) for column in ORDERING))
+        try:
+            rows, cursor = keyset_page(rows, request.query_params.get('cursor'), page_size(request.query_params), position)
+        except InvalidQueryError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        transactions = Transaction.objects.filter(user=user)
-        serializer = self.get_serializer(transactions, many=True)
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', cursor) if cursor else None
 
-        return Response({"success": serializer.data}, status=status.HTTP_200_OK)
+        return Response({"success": serializer.to_representation(rows), "next": next_url}, status=status.HTTP_200_OK)
    
 
 class AddTransactionView(APIView):
@@ -87,7 +169,8 @@ class AddTransactionView(APIView):
     @swagger_auto_schema(
         operation_summary="Add or Update Transactions",
         operation_description="""
-        This endpoint allows authenticated users to add or update if already present, transactions by uploading an Excel file.
+        This endpoint allows authenticated users to add or update if already present, transactions by uploading an Excel, CSV, TSV, gzipped CSV or JSON Lines file.
+        The format is detected from the file content, falling back to the content type sent with the file.
 
         **Note:**
         To Test This Endpoint in Postman follow the steps:
@@ -116,58 +199,238 @@ class AddTransactionView(APIView):
         ```
 
         **Request Body:**
-        - **file**: An Excel file containing transaction data. The file must include the following headers: 'Product', 'Asset Class', 'Date', 'Amount', 'Units'.
+        - **file**: An Excel (.xlsx), CSV, TSV, gzipped CSV/TSV or JSON Lines file containing transaction data. The file must include the following headers: 'Product', 'Asset Class', 'Date', 'Amount', 'Units'.
+        'Asset Class' must be one of Equity, Debt, Alternate.
+
+        **Query Parameters:**
+        - **async**: Set `async=1` to process the file in the background. The file is stored and a job id is returned right away,
+        poll `/transactions/jobs/<job_id>/` for its progress. Jobs are processed by `python manage.py run_upload_worker`.
 
         **Response:**
-        - **200 OK**: Success message when data is successfully processed.
-        - **400 Bad Request**: Error messages for invalid file or data issues.
+        - **200 OK**: Success message when data is successfully processed, with count of `inserted`, `updated` and `unchanged` transactions
+        (rows identical to what is already stored are not written again)
+        and of `duplicates` (same product on the same day more than once in the file, the last row is kept).
+        `replayed` is true when the same file was already processed for the user recently and their transactions did
+        not change since, the earlier result is returned and the file is not processed again.
+        - **202 Accepted**: File stored for background processing, returns the `job` id and its `status_url`.
+        - **400 Bad Request**: Error messages for invalid file or data issues. When rows are invalid nothing is written and
+        `errors` lists the row, column and problem of the first 100 bad rows, `error_count` has the total.
         """,
     )
     def post(self, request, *args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({"error": "Authorization header missing or invalid"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        user = get_current_user(auth_header)
-
-        if not user:
-            return Response({"error": "User Dont Exist"}, status=status.HTTP_404_NOT_FOUND)
-
+        user = user_row(request.user)
 
         file = request.FILES.get('file')
         if not file:
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = file_fingerprint(file)
+        return process_upload(request, user, file, file.content_type, fingerprint, lambda: enqueue_upload(user, file, fingerprint))
+
+class UploadJobView(APIView):
+    permission_classes = [IsAuthenticated]
+    @swagger_auto_schema(
+        operation_summary="Get Upload Job Status",
+        operation_description="""
+        This endpoint reports the progress of a background upload started with `/transactions/upload/?async=1`.
+
+        **Authentication:**
+        This endpoint requires JWT authentication. Include your token in the `Authorization` header as follows:
+
+        ```
+        Authorization: Bearer <your_token_here>
+        ```
+
+        **Response:**
+        - **200 OK**: Returns the job state (`QUEUED`, `RUNNING`, `DONE`, `FAILED`), rows processed, throughput in rows/sec and errors if any.
+        - **404 Not Found**: No such job for the authenticated user.
+
+        **Example Response:**
+        ```json
+        {
+            "success": {
+                "id": "0b7c9a1e-...",
+                "state": "DONE",
+                "rows_processed": 50000,
+                "inserted": 49000,
+                "updated": 1000,
+                "throughput": 21345.12,
+                "errors": null,
+                ...
+            }
+        }
+        ```
+        """,
+    )
+    def get(self, request, job_id, *args, **kwargs):
+        user = request.user
+
+        job = UploadJob.objects.filter(id=job_id, user_id=user.pk).first()
+        if not job:
+            return Response({"error": "Job Dont Exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({"success": job_status(job)}, status=status.HTTP_200_OK)
+
+
+class ChunkedUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+    @swagger_auto_schema(
+        operation_summary="Start a Chunked Upload",
+        operation_description="""
+        This endpoint starts an upload of a large statement which is sent in pieces. Send the pieces in order to
+        `/transactions/uploads/<upload_id>/` and finish with `/transactions/uploads/<upload_id>/finalize/`.
+        An interrupted upload is resumed from the last acknowledged offset instead of starting over.
+
+        **Authentication:**
+        This endpoint requires JWT authentication. Include your token in the `Authorization` header as follows:
+
+        ```
+        Authorization: Bearer <your_token_here>
+        ```
+
+        **Request Body:**
+        - **filename**: Name of the file.
+        - **content_type**: Optional, content type of the file (the format is detected from the content anyway).
+        - **size**: Optional, total size in bytes. When given, larger uploads are refused and finalize checks every byte arrived.
+
+        Uploads are limited to `CHUNKED_UPLOAD_MAX_SIZE` bytes (1 GiB) and removed when no chunk arrived for
+        `CHUNKED_UPLOAD_EXPIRY` (24 hours).
+
+        **Response:**
+        - **201 Created**: Returns the `upload` id, `offset` (0) and the `upload_url` to send the pieces to.
+        - **413 Request Entity Too Large**: The declared size is over the limit.
+        """,
+    )
+    def post(self, request, *args, **kwargs):
+        user = user_row(request.user)
+
+        size = request.data.get('size')
+        if size is not None:
+            try:
+                size = int(size)
+            except (TypeError, ValueError):
+                return Response({"error": "size must be a number of bytes"}, status=status.HTTP_400_BAD_REQUEST)
+            if size < 0:
+                return Response({"error": "size must be a number of bytes"}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            excel_file = BytesIO(file.read())
-            df = pd.read_excel(excel_file)
-            necessary_headers = ['Product', 'Asset Class', 'Date', 'Amount', 'Units']
-            
-            for header in necessary_headers:
-                if not header in df.columns:
-                    return Response({"error": "One or More Necessary Header Missing", "necessary headers": ['Product', 'Asset Class', 'Date', 'Amount', 'Units']}, status=status.HTTP_400_BAD_REQUEST)
-                
-            records = df.to_dict(orient='records')
-            for record in records:
-                earlier_transaction = Transaction.objects.filter(user=user, product=record['Product'], date_of_transaction=record['Date'])
-                if not earlier_transaction: # if record is not present create one
-                    Transaction.objects.create(
-                        user=user,
-                        product=record['Product'], 
-                        asset_class=record['Asset Class'], 
-                        date_of_transaction=record['Date'],
-                        units=record['Units'],
-                        amount=record['Amount']             
-                    )
-                else: # if record is present update it.
-                    earlier_transaction = earlier_transaction[0]
-                    earlier_transaction.asset_class = record['Asset Class']
-                    earlier_transaction.units = record['Units']
-                    earlier_transaction.amount = record['Amount']
-                    earlier_transaction.save()
-
-            return Response({"Success": 'Data uploaded for the user.', "user": user.arn_number}, status=status.HTTP_200_OK)
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            upload = start_upload(user, request.data.get('filename'), request.data.get('content_type'), size)
+        except UploadSizeError as e:
+            return Response({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        response = chunked_upload_status(upload)
+        response["upload_url"] = reverse('chunked-upload-detail', args=[upload.id])
+        return Response(response, status=status.HTTP_201_CREATED)
+
+
+class ChunkedUploadDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+    @swagger_auto_schema(
+        operation_summary="Get Chunked Upload Offset",
+        operation_description="""
+        This endpoint returns how many bytes of a chunked upload were received, a client resumes by sending the rest starting at `offset`.
+
+        **Response:**
+        - **200 OK**: Returns the `upload` id, `filename`, `size`, `offset` and `state` (`OPEN` or `FINALIZED`).
+        - **404 Not Found**: No such upload for the authenticated user.
+        """,
+    )
+    def get(self, request, upload_id, *args, **kwargs):
+        user = request.user
+
+        upload = ChunkedUpload.objects.filter(id=upload_id, user_id=user.pk).first()
+        if not upload:
+            return Response({"error": "Upload Dont Exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({"success": chunked_upload_status(upload)}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Append a Chunk",
+        operation_description="""
+        This endpoint appends the raw request body to a chunked upload. The body is written straight to disk.
+
+        **Note:**
+        The `Upload-Offset` header must be the offset returned by the previous chunk (0 for the first one).
+        ```bash
+        curl --location --request PUT 'http://127.0.0.1:8000/transactions/uploads/<upload_id>/' \
+        --header 'Authorization: Bearer <your_token_here>' \
+        --header 'Upload-Offset: 0' \
+        --header 'Content-Type: application/octet-stream' \
+        --data-binary '@part-1'
+        ```
+
+        **Response:**
+        - **200 OK**: Chunk stored, returns the new `offset`.
+        - **404 Not Found**: No such open upload for the authenticated user.
+        - **409 Conflict**: `Upload-Offset` is not the acknowledged offset, returns the `offset` to resume from.
+        - **413 Request Entity Too Large**: The chunk goes past the declared size, or the size limit when none was declared.
+        """,
+    )
+    def put(self, request, upload_id, *args, **kwargs):
+        user = request.user
+
+        upload = ChunkedUpload.objects.filter(id=upload_id, user_id=user.pk, state='OPEN').first()
+        if not upload:
+            return Response({"error": "Upload Dont Exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            offset = int(request.headers.get('Upload-Offset', request.query_params.get('offset')))
+        except (TypeError, ValueError):
+            return Response({"error": "Upload-Offset header missing or invalid", "offset": upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # the body is read from the request stream piece by piece, it is never parsed or held in memory.
+            offset = append_chunk(upload, offset, request.stream)
+        except OffsetMismatchError as e:
+            return Response({"error": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT)
+        except UploadSizeError as e:
+            return Response({"error": str(e), "offset": upload.offset}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        return Response({"offset": offset}, status=status.HTTP_200_OK)
+
+    patch = put
+
+
+class ChunkedUploadFinalizeView(APIView):
+    permission_classes = [IsAuthenticated]
+    @swagger_auto_schema(
+        operation_summary="Finalize a Chunked Upload",
+        operation_description="""
+        This endpoint processes a chunked upload once every piece was sent, exactly like `/transactions/upload/`.
+
+        **Query Parameters:**
+        - **async**: Set `async=1` to process the file in the background, poll `/transactions/jobs/<job_id>/` for its progress.
+
+        **Response:**
+        - Same as `/transactions/upload/`.
+        - **400 Bad Request**: Also returned when fewer bytes than the declared size were received, nothing is processed and more chunks can still be sent.
+        - **404 Not Found**: No such open upload for the authenticated user.
+        """,
+    )
+    def post(self, request, upload_id, *args, **kwargs):
+        user = user_row(request.user)
+
+        upload = ChunkedUpload.objects.filter(id=upload_id, user_id=user.pk, state='OPEN').first()
+        if not upload:
+            return Response({"error": "Upload Dont Exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            check_complete(upload)
+        except UploadSizeError as e:
+            return Response({"error": str(e), "offset": upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        # conditional update so a retried finalize does not process the file twice.
+        if not ChunkedUpload.objects.filter(id=upload.id, state='OPEN').update(state='FINALIZED'):
+            return Response({"error": "Upload Dont Exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        with open(upload.file_path, 'rb') as file:
+            fingerprint = file_fingerprint(File(file))
+            response = process_upload(request, user, file, upload.content_type, fingerprint, lambda: enqueue_file(user, upload.file_path, upload.content_type, fingerprint))
+
+        # a queued job removes the file once it ran.
+        if response.status_code != status.HTTP_202_ACCEPTED:
+            remove_upload_file(upload)
+        return response
+
 
 class Summary(APIView):
     permission_classes = [IsAuthenticated]  
@@ -183,8 +446,12 @@ class Summary(APIView):
         Authorization: Bearer <your_token_here>
         ```
 
+        **Conditional Requests:**
+        Responses carry an `ETag`, send it back in `If-None-Match` to get `304 Not Modified` while the transactions did not change.
+
         **Response:**
         - **200 OK**: Returns a summary of transactions by financial year.
+        - **304 Not Modified**: `If-None-Match` holds the current `ETag`.
 
         **Example Response:**
         ```json
@@ -205,53 +472,121 @@ class Summary(APIView):
         """,
     )
     def get(self, request, *args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return Response({"error": "Authorization header missing or invalid"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        user = get_current_user(auth_header)
+        user = request.user
 
-        if not user:
-            return Response({"error": "User Dont Exist"}, status=status.HTTP_404_NOT_FOUND)
+        # totals are read from the financial year summary table, and served from the response cache until
+        # the user's data changes.
+        return versioned_response(self, request, user, 'summary', lambda: Response({"success": user_summary(user)}, status=status.HTTP_200_OK))
 
-        transactions = Transaction.objects.filter(user=user)
-        
-        summary = {}
-        # logic to create summary sheet
-        for t in transactions:
-            time = t.date_of_transaction
-            timestamp_curr = time.timestamp()
-            year = time.year
-            
-            check_1 = f"{year}-04-01T00:00:00+05:30"
-            check_2 = f"{year+1}-04-01T00:00:00+05:30"
-            timestamp_1 = datetime.datetime.fromisoformat(check_1).timestamp()
-            timestamp_2 = datetime.datetime.fromisoformat(check_2).timestamp()
-            #  if date is inside current financial year or previous financial year.
-            if timestamp_curr >= timestamp_1 and timestamp_curr < timestamp_2:
-                financial_year = f"FY{str(year)[-2:]}-{str(year+1)[-2:]}"
-            elif timestamp_curr < timestamp_1:
-                financial_year = f"FY{str(year-1)[-2:]}-{str(year)[-2:]}"
-            else:
-                continue
-            
-            if financial_year not in summary:
-                summary[financial_year] = {
-                    "Equity": 0,
-                    "Debt": 0,
-                    "Alternate": 0
-                }
-            
-            asset = t.asset_class
-            if asset == "Equity":
-                summary[financial_year]["Equity"] += t.amount
-            elif asset == "Debt":
-                summary[financial_year]["Debt"] += t.amount
-            elif asset == "Alternate":
-                summary[financial_year]["Alternate"] += t.amount
-
-        # order was random so sorted in descending order of financial years
-        summary = dict(sorted(summary.items(), reverse=True))
 
-        
-        return Response({"success": summary}, status=status.HTTP_200_OK)
+class Returns(APIView):
+    permission_classes = [IsAuthenticated]
+    @swagger_auto_schema(
+        operation_summary="Get Returns (XIRR)",
+        operation_description="""
+        This endpoint computes the annualized return (XIRR) of every product, every asset class and the whole portfolio
+        of the authenticated user from the transaction cash flows.
+
+        **Authentication:**
+        This endpoint requires JWT authentication. Include your token in the `Authorization` header as follows:
+
+        ```
+        Authorization: Bearer <your_token_here>
+        ```
+
+        **Cash Flows:**
+        The `Amount` of each transaction is a cash flow on its date: money invested is negative, money redeemed (or the
+        current value, entered as a transaction) is positive. A rate is `null` when its flows are all of one sign.
+        Rates are fractions, `0.12` is 12% a year.
+
+        **Conditional Requests:**
+        Responses carry an `ETag`, send it back in `If-None-Match` to get `304 Not Modified` while the transactions did not change.
+
+        **Response:**
+        - **200 OK**: Returns the rates.
+        - **304 Not Modified**: `If-None-Match` holds the current `ETag`.
+
+        **Example Response:**
+        ```json
+        {
+            "success": {
+                "portfolio": 0.112345,
+                "asset_classes": {"Equity": 0.142311, "Debt": 0.071002},
+                "products": {"PRODUCT_001": 0.142311, "PRODUCT_002": 0.071002}
+            }
+        }
+        ```
+        """,
+    )
+    def get(self, request, *args, **kwargs):
+        user = request.user
+
+        # every rate comes from one batched solve, served from the response cache until the user's data changes.
+        return versioned_response(self, request, user, 'returns', lambda: Response({"success": user_returns(user)}, status=status.HTTP_200_OK))
+
+
+class AllSummaries(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    renderer_classes = [JSONRenderer, CSVRenderer]
+    @swagger_auto_schema(
+        operation_summary="Get Transaction Summaries of All Users",
+        operation_description="""
+        This endpoint provides the financial year summary of every user, or of the given ARN numbers, in one response.
+        It is accessible only to authenticated admin users.
+
+        **Authentication:**
+        This endpoint requires JWT authentication. Include your token in the `Authorization` header as follows:
+
+        ```
+        Authorization: Bearer <your_token_here>
+        ```
+
+        **Query Parameters:**
+        - **arn_numbers**: Comma separated ARN numbers to export, e.g. `arn_numbers=12345,67890`. Every user by default.
+        - **format**: `json` (default) or `csv`, `Accept: text/csv` works too.
+
+        The totals are read in one pass over the summary table and streamed as they are read. Users without
+        transactions are left out.
+
+        **Response:**
+        - **200 OK**: Returns the summaries by ARN number then newest financial year. CSV has one line per user and
+        financial year: `arn_number,financial_year,Equity,Debt,Alternate`.
+        - **400 Bad Request**: `arn_numbers` is invalid.
+        - **403 Forbidden**: The user is not an admin.
+
+        **Example Response:**
+        ```json
+        {
+            "success": [
+                {
+                    "arn_number": 12345,
+                    "summary": {
+                        "FY24-25": {"Equity": 1000, "Debt": 2000, "Alternate": 3000},
+                        "FY23-24": {"Equity": 1000, "Debt": 2000, "Alternate": 0}
+                    }
+                },
+                ...
+            ]
+        }
+        ```
+        """,
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            arn_numbers = parse_arn_numbers(request.query_params)
+        except InvalidQueryError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        summaries = all_user_summaries(arn_numbers)
+        if request.accepted_renderer.format == 'csv':
+            labels = list(ASSET_LABELS.values())
+            rows = ((arn_number, year, *(totals[label] for label in labels)) for arn_number, year, totals in summaries)
+            response = StreamingHttpResponse(csv_stream(['arn_number', 'financial_year', *labels], rows), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="summaries.csv"'
+            return response
+
+        users = (
+            {"arn_number": arn_number, "summary": {year: totals for _, year, totals in years}}
+            for arn_number, years in groupby(summaries, key=itemgetter(0))
+        )
+        return StreamingHttpResponse(json_items_stream(users), content_type='application/json')
@@ -0,0 +1,184 @@
+import math
+import numpy as np
+
+# XIRR kept free of Django imports. Many cash flow series are solved at once: every flow carries the index of
+# the series (group) it belongs to, sums over a series are np.bincount() over that index, so one Newton step
+# for every series is a handful of array operations whatever the number of series.
+
+DAYS_PER_YEAR = 365.0
+GUESS = 0.1
+MAX_NEWTON_ITERATIONS = 50
+MAX_BISECTION_ITERATIONS = 200
+# a rate is solved once a step moves it less than this (relative to the rate when above 1).
+TOLERANCE = 1e-10
+# the rate can not reach -100%, bisection starts just above it.
+LOWEST_RATE = -0.999999
+HIGHEST_RATE = 1e6
+
+
+# net present value of every series at its rate, and its derivative. per series work (log1p, the division) is
+# done once per series rather than once per flow.
+def npv_and_slope(rates, groups, years, amounts):
+    discounted = amounts * np.exp(-years * np.log1p(rates)[groups])
+    npv = np.bincount(groups, discounted, minlength=len(rates))
+    slope = -np.bincount(groups, years * discounted, minlength=len(rates)) / (1 + rates)
+    return npv, slope
+
+
+# the flows of the series in `active`. solvers keep the flows they work on and narrow them down once less than
+# half of those series are left, so the last few slow series do not cost a pass over every flow.
+def active_flows(active, groups, years, amounts):
+    mask = active[groups]
+    return groups[mask], years[mask], amounts[mask]
+
+
+class Flows:
+    def __init__(self, active, groups, years, amounts):
+        self.series = active.sum()
+        self.flows = active_flows(active, groups, years, amounts)
+
+    def of(self, active):
+        series = active.sum()
+        if series < self.series / 2:
+            self.series = series
+            self.flows = active_flows(active, *self.flows)
+        return self.flows
+
+
+# years between every flow and the first flow of its series.
+def series_years(groups, days, group_count):
+    first = np.full(group_count, np.iinfo(np.int64).max)
+    np.minimum.at(first, groups, days)
+    return (days - first[groups]) / DAYS_PER_YEAR
+
+
+# annual rate at which the flows of every series add up to 0, NaN when there is none (flows of one sign,
+# or no sign change of the NPV the solver can find).
+# groups: series index of every flow, days: day number of every flow, amounts: signed cash flows.
+def xirr(groups, days, amounts, group_count, guess=GUESS):
+    groups = np.asarray(groups, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=float)
+    years = series_years(groups, np.asarray(days, dtype=np.int64), group_count)
+    rates = np.full(group_count, guess, dtype=float)
+
+    inflows = np.bincount(groups, amounts > 0, minlength=group_count) > 0
+    outflows = np.bincount(groups, amounts < 0, minlength=group_count) > 0
+    solvable = inflows & outflows
+    solved = np.zeros(group_count, dtype=bool)
+
+    with np.errstate(all='ignore'):
+        # Newton from the guess, converges in a few steps for most series.
+        active = solvable.copy()
+        flows = Flows(active, groups, years, amounts)
+        for _ in range(MAX_NEWTON_ITERATIONS):
+            if not active.any():
+                break
+            npv, slope = npv_and_slope(rates, *flows.of(active))
+            step = npv / slope
+            stepped = rates - step
+            # a step below -100% goes halfway there instead.
+            stepped = np.where(stepped <= -1, (rates - 1) / 2, stepped)
+            failed = active & ~np.isfinite(stepped)
+            rates = np.where(active & ~failed, stepped, rates)
+            converged = active & ~failed & (np.abs(step) <= TOLERANCE * np.maximum(1, np.abs(rates)))
+            solved |= converged
+            active &= ~(converged | failed)
+
+        # bisection for the series Newton did not solve, on a bracket where the NPV changes sign.
+        remaining = solvable & ~solved
+        if remaining.any():
+            solved |= bisect(rates, groups, years, amounts, remaining)
+
+    return np.where(solved, rates, np.nan)
+
+
+# solves the `remaining` series in place by bisection, returns the ones with a sign change to bracket.
+def bisect(rates, groups, years, amounts, remaining):
+    group_count = len(rates)
+    low = np.full(group_count, LOWEST_RATE)
+    high = np.full(group_count, 1.0)
+    flows = Flows(remaining, groups, years, amounts)
+    npv_low, _ = npv_and_slope(low, *flows.of(remaining))
+    npv_high, _ = npv_and_slope(high, *flows.of(remaining))
+    # the bracket is widened upwards until the NPV changes sign or the rate gets absurd.
+    unbracketed = remaining & (np.signbit(npv_low) == np.signbit(npv_high))
+    widening = Flows(unbracketed, groups, years, amounts)
+    while unbracketed.any() and high[unbracketed].max() < HIGHEST_RATE:
+        high = np.where(unbracketed, high * 10, high)
+        npv_widened, _ = npv_and_slope(high, *widening.of(unbracketed))
+        npv_high = np.where(unbracketed, npv_widened, npv_high)
+        unbracketed &= np.signbit(npv_low) == np.signbit(npv_high)
+    bracketed = remaining & ~unbracketed & np.isfinite(npv_low) & np.isfinite(npv_high)
+    active = bracketed.copy()
+
+    for _ in range(MAX_BISECTION_ITERATIONS):
+        if not active.any():
+            break
+        middle = (low + high) / 2
+        npv_middle, _ = npv_and_slope(middle, *flows.of(active))
+        lower_half = np.signbit(npv_middle) == np.signbit(npv_low)
+        low = np.where(active & lower_half, middle, low)
+        npv_low = np.where(active & lower_half, npv_middle, npv_low)
+        high = np.where(active & ~lower_half, middle, high)
+        rates[active] = middle[active]
+        active &= (high - low) > TOLERANCE * np.maximum(1, np.abs(middle))
+    return bracketed
+
+
+# the same solver for one series with plain Python floats, the reference the batched solver is checked
+# and benchmarked against.
+def scalar_xirr(days, amounts, guess=GUESS):
+    if not (any(amount > 0 for amount in amounts) and any(amount < 0 for amount in amounts)):
+        return math.nan
+    first = min(days)
+    years = [float(day - first) / DAYS_PER_YEAR for day in days]
+    amounts = [float(amount) for amount in amounts]
+
+    def npv_and_slope(rate):
+        npv = slope = 0.0
+        for year, amount in zip(years, amounts):
+            discounted = amount * math.exp(-year * math.log1p(rate))
+            npv += discounted
+            slope -= year * discounted / (1 + rate)
+        return npv, slope
+
+    rate = guess
+    for _ in range(MAX_NEWTON_ITERATIONS):
+        try:
+            npv, slope = npv_and_slope(rate)
+            step = npv / slope
+        except (OverflowError, ZeroDivisionError, ValueError):
+            break
+        stepped = rate - step
+        if stepped <= -1:
+            stepped = (rate - 1) / 2
+        if not math.isfinite(stepped):
+            break
+        rate = stepped
+        if abs(step) <= TOLERANCE * max(1, abs(rate)):
+            return rate
+
+    low, high = LOWEST_RATE, 1.0
+
+    def signbit(value):
+        return math.copysign(1, value) < 0
+
+    try:
+        npv_low, npv_high = npv_and_slope(low)[0], npv_and_slope(high)[0]
+        while signbit(npv_low) == signbit(npv_high) and high < HIGHEST_RATE:
+            high *= 10
+            npv_high = npv_and_slope(high)[0]
+    except OverflowError:
+        return math.nan
+    if not (math.isfinite(npv_low) and math.isfinite(npv_high)) or signbit(npv_low) == signbit(npv_high):
+        return math.nan
+    for _ in range(MAX_BISECTION_ITERATIONS):
+        middle = (low + high) / 2
+        npv_middle = npv_and_slope(middle)[0]
+        if signbit(npv_middle) == signbit(npv_low):
+            low, npv_low = middle, npv_middle
+        else:
+            high = middle
+        if high - low <= TOLERANCE * max(1, abs(middle)):
+            break
+    return middle